@@ -0,0 +1,496 @@
+"""
+Benchmark the Lambda handlers offline
+
+Seeds moto's in-process stand-ins for DynamoDB, S3, SQS and CloudFront with a
+synthetic meetings table, then runs `rebuild_site`, `queue_receiver` and
+`auth_check` against it.  For each run it reports wall time, AWS API calls,
+estimated DynamoDB read capacity, S3 PUT count and bytes, CloudFront
+invalidation paths, and peak resident memory.
+
+Usage:
+
+    python benchmarks/run_benchmarks.py --sizes 1000 10000 --organizations 5 --topics 20
+
+Each table size runs in its own process, so memory figures do not carry
+over from one size to the next.  Requires `moto` (a dev dependency).
+"""
+import argparse
+import json
+import math
+import multiprocessing
+import os
+import random
+import resource
+import sys
+import tempfile
+import threading
+import time
+import types
+from collections import Counter
+from datetime import datetime, timedelta
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+REGION = "us-east-1"
+ACCOUNT_ID = "123456789012"
+TABLE_NAME = "benchmark-meetings"
+BUCKET_NAME = "benchmark-website"
+QUEUE_NAME = "benchmark-notify-webbuilder"
+HOSTNAME = "recordings.example.org"
+
+BENCHMARK_ENVIRONMENT = {
+    "AWS_DEFAULT_REGION": REGION,
+    "AWS_ACCESS_KEY_ID": "benchmark",
+    "AWS_SECRET_ACCESS_KEY": "benchmark",
+    "MEETINGS_TABLE_ARN": f"arn:aws:dynamodb:{REGION}:{ACCOUNT_ID}:table/{TABLE_NAME}",
+    "WEBSITE_BUCKET": BUCKET_NAME,
+    "NOTIFY_WEBBUILDER_QUEUE_ARN": f"arn:aws:sqs:{REGION}:{ACCOUNT_ID}:{QUEUE_NAME}",
+    "PUBLIC_KEY_ID": "BENCHMARKKEY",
+    "HOSTNAME": HOSTNAME,
+}
+
+
+class CallRecorder:
+    """
+    Count every AWS API call made through botocore, whichever client or
+    thread makes it, along with the sizes of what was read and written.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        self.calls = Counter()
+        self.dynamodb_bytes_read = 0
+        self.dynamodb_rcu = 0.0
+        self.s3_puts = 0
+        self.s3_put_bytes = 0
+        self.invalidation_paths = list()
+
+    def install(self):
+        from botocore.client import BaseClient
+
+        original = BaseClient._make_api_call
+        recorder = self
+
+        def _make_api_call(client, operation_name, api_params):
+            ## Measure the body up front; botocore may consume it while sending
+            body_length = _body_length(api_params.get("Body", b""))
+            response = original(client, operation_name, api_params)
+            recorder.record(
+                client.meta.service_model.service_name,
+                operation_name,
+                api_params,
+                response,
+                body_length,
+            )
+            return response
+
+        BaseClient._make_api_call = _make_api_call
+
+    def record(self, service, operation_name, api_params, response, body_length=0):
+        with self._lock:
+            self.calls[f"{service}:{operation_name}"] += 1
+            if service == "dynamodb" and operation_name in ("Query", "Scan"):
+                ## Estimate eventually consistent read capacity from the bytes
+                ## returned: 0.5 RCU per 4 KB, rounded up per request
+                read = len(json.dumps(response.get("Items", []), default=str))
+                self.dynamodb_bytes_read += read
+                self.dynamodb_rcu += 0.5 * max(1, math.ceil(read / 4096))
+            elif service == "dynamodb" and operation_name == "GetItem":
+                read = len(json.dumps(response.get("Item", {}), default=str))
+                self.dynamodb_bytes_read += read
+                self.dynamodb_rcu += 0.5 * max(1, math.ceil(read / 4096))
+            elif service == "s3" and operation_name == "PutObject":
+                self.s3_puts += 1
+                self.s3_put_bytes += body_length
+            elif service == "cloudfront" and operation_name == "CreateInvalidation":
+                self.invalidation_paths.extend(
+                    api_params["InvalidationBatch"]["Paths"]["Items"]
+                )
+
+    def report(self):
+        with self._lock:
+            return {
+                "api_calls": dict(sorted(self.calls.items())),
+                "dynamodb_bytes_read": self.dynamodb_bytes_read,
+                "dynamodb_rcu_estimate": self.dynamodb_rcu,
+                "s3_puts": self.s3_puts,
+                "s3_put_bytes": self.s3_put_bytes,
+                "invalidation_paths": len(self.invalidation_paths),
+                "invalidation_sample": self.invalidation_paths[:5],
+            }
+
+
+def _body_length(body):
+    if isinstance(body, (bytes, bytearray)):
+        return len(body)
+    if isinstance(body, str):
+        return len(body.encode("utf-8"))
+    if hasattr(body, "seek") and hasattr(body, "tell"):
+        position = body.tell()
+        body.seek(0, os.SEEK_END)
+        length = body.tell() - position
+        body.seek(position)
+        return length
+    return 0
+
+
+def _reset_peak_rss():
+    """Reset the kernel's peak RSS counter (Linux only)"""
+    try:
+        with open("/proc/self/clear_refs", "w") as fp:
+            fp.write("5")
+        return True
+    except OSError:
+        return False
+
+
+def _peak_rss_kb():
+    try:
+        with open("/proc/self/status") as fp:
+            for line in fp:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    ## ru_maxrss is the peak for the whole process, in KB on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+def synthetic_meetings(count, organizations, topics, seed=1, first=0):
+    """Generate meeting documents shaped like those in the production table
+
+    :param count: number of meetings
+    :param organizations: number of organizations
+    :param topics: number of meeting topics per organization
+    :param seed: random seed, so runs are repeatable
+    :param first: number of the first meeting, to keep ids unique
+
+    :returns: generator of meeting dictionaries
+    """
+    from serverless_recordings_site.util.string_constructors import (
+        project_time,
+        recording_path,
+    )
+
+    rnd = random.Random(seed)
+    start = datetime(2019, 1, 1)
+    for i in range(first, first + count):
+        org_number = rnd.randrange(organizations)
+        organization = f"Org{org_number}"
+        meeting_topic = f"Working Group {rnd.randrange(topics)} ({organization})"
+        begin = start + timedelta(minutes=5 * rnd.randrange(365 * 24 * 12 * 4))
+        start_time = begin.strftime("%Y-%m-%dT%H:%M:%SZ")
+        end_time = (begin + timedelta(minutes=60)).strftime("%Y-%m-%dT%H:%M:%SZ")
+        path = recording_path(organization=organization, meeting_topic=meeting_topic)
+        meeting = {
+            "recording_id": f"rec-{i:07d}",
+            "organization": organization,
+            "meeting_topic": meeting_topic,
+            "start_time": start_time,
+            "end_time": end_time,
+            "recording_path": f"{path}/{project_time(start_time, do_round=True)}-{i}",
+            "files": [
+                {
+                    "recording_type": kind,
+                    "s3_url": f"https://example.org/{i}/{kind}.mp4",
+                }
+                for kind in ("shared_screen_with_speaker_view", "audio_only")
+            ],
+        }
+        if i % 4 == 0:
+            meeting["password"] = f"secret{i}"
+        yield meeting
+
+
+def create_resources(meetings):
+    """Create the table, bucket, queue and distribution, and seed the table
+
+    :param meetings: iterable of meeting documents
+
+    :returns: CloudFront distribution id
+    """
+    import boto3
+
+    dynamodb = boto3.client("dynamodb")
+    dynamodb.create_table(
+        TableName=TABLE_NAME,
+        BillingMode="PAY_PER_REQUEST",
+        KeySchema=[{"AttributeName": "recording_id", "KeyType": "HASH"}],
+        AttributeDefinitions=[
+            {"AttributeName": name, "AttributeType": "S"}
+            for name in (
+                "recording_id",
+                "recording_path",
+                "meeting_topic",
+                "organization",
+                "start_time",
+            )
+        ],
+        GlobalSecondaryIndexes=[
+            {
+                "IndexName": "path-index",
+                "KeySchema": [{"AttributeName": "recording_path", "KeyType": "HASH"}],
+                "Projection": {"ProjectionType": "ALL"},
+            },
+            {
+                "IndexName": "meeting-index",
+                "KeySchema": [
+                    {"AttributeName": "meeting_topic", "KeyType": "HASH"},
+                    {"AttributeName": "start_time", "KeyType": "RANGE"},
+                ],
+                "Projection": {"ProjectionType": "ALL"},
+            },
+            {
+                "IndexName": "organization-index",
+                "KeySchema": [
+                    {"AttributeName": "organization", "KeyType": "HASH"},
+                    {"AttributeName": "start_time", "KeyType": "RANGE"},
+                ],
+                "Projection": {"ProjectionType": "ALL"},
+            },
+        ],
+    )
+    table = boto3.resource("dynamodb").Table(TABLE_NAME)
+    with table.batch_writer() as batch:
+        for meeting in meetings:
+            batch.put_item(Item=meeting)
+
+    boto3.client("s3").create_bucket(Bucket=BUCKET_NAME)
+    boto3.client("sqs").create_queue(QueueName=QUEUE_NAME)
+    distribution = boto3.client("cloudfront").create_distribution(
+        DistributionConfig={
+            "CallerReference": "benchmark",
+            "Comment": "benchmark",
+            "Enabled": True,
+            "Origins": {
+                "Quantity": 1,
+                "Items": [
+                    {
+                        "Id": "S3-private-bucket",
+                        "DomainName": f"{BUCKET_NAME}.s3.amazonaws.com",
+                        "S3OriginConfig": {"OriginAccessIdentity": ""},
+                    }
+                ],
+            },
+            "DefaultCacheBehavior": {
+                "TargetOriginId": "S3-private-bucket",
+                "ViewerProtocolPolicy": "redirect-to-https",
+                "MinTTL": 0,
+                "ForwardedValues": {
+                    "QueryString": False,
+                    "Cookies": {"Forward": "none"},
+                },
+            },
+        }
+    )
+    return distribution["Distribution"]["Id"]
+
+
+def make_task_root():
+    """Lay out a stand-in for LAMBDA_TASK_ROOT with a throwaway signing key
+
+    :returns: directory name
+    """
+    import rsa
+
+    task_root = tempfile.mkdtemp(prefix="benchmark-task-root-")
+    for name in ("page_templates", "site_html", "compiled_templates"):
+        if os.path.isdir(source := os.path.join(REPO_ROOT, name)):
+            os.symlink(source, os.path.join(task_root, name))
+    os.mkdir(os.path.join(task_root, "keys"))
+    _, private_key = rsa.newkeys(2048)
+    with open(os.path.join(task_root, "keys", "private_key.pem"), "wb") as fp:
+        fp.write(private_key.save_pkcs1())
+    return task_root
+
+
+def measure(name, recorder, prepare, *args):
+    """Run one benchmark and collect its measurements
+
+    :param name: benchmark name
+    :param recorder: CallRecorder
+    :param prepare: callable that does any set-up and returns the callable to measure
+    :param args: passed to `prepare`
+
+    :returns: dictionary of measurements
+    """
+    function = prepare(*args)
+    recorder.reset()
+    peak_reset = _reset_peak_rss()
+    started = time.perf_counter()
+    result = function()
+    elapsed = time.perf_counter() - started
+    report = {
+        "benchmark": name,
+        "wall_seconds": round(elapsed, 3),
+        "peak_rss_kb": _peak_rss_kb(),
+        "peak_rss_is_process_wide": not peak_reset,
+    }
+    report.update(recorder.report())
+    if isinstance(result, dict):
+        report["result"] = result
+    return report
+
+
+def _context():
+    return types.SimpleNamespace(
+        aws_request_id=f"benchmark-{time.time_ns()}",
+        get_remaining_time_in_millis=lambda: 300_000,
+    )
+
+
+def bench_rebuild_site(event):
+    from serverless_recordings_site import rebuild_site
+
+    return lambda: rebuild_site.handler(event, _context())
+
+
+def bench_queue_receiver(meetings):
+    import boto3
+
+    from serverless_recordings_site import queue_receiver
+
+    ## The receive-recording stack writes the meeting before notifying us
+    table = boto3.resource("dynamodb").Table(TABLE_NAME)
+    for meeting in meetings:
+        table.put_item(Item=meeting)
+    sqs = boto3.client("sqs")
+    queue_url = sqs.get_queue_url(QueueName=QUEUE_NAME)["QueueUrl"]
+    for meeting in meetings:
+        sqs.send_message(QueueUrl=queue_url, MessageBody=json.dumps(meeting))
+    messages = sqs.receive_message(QueueUrl=queue_url, MaxNumberOfMessages=10)
+    event = {
+        "Records": [
+            {
+                "messageId": message["MessageId"],
+                "receiptHandle": message["ReceiptHandle"],
+                "body": message["Body"],
+            }
+            for message in messages.get("Messages", [])
+        ]
+    }
+    return lambda: queue_receiver.handler(event, _context())
+
+
+def bench_auth_check(meetings, logins):
+    from serverless_recordings_site import authn_check
+
+    rnd = random.Random(2)
+    ## A few popular recordings get most of the logins
+    popular = meetings[: max(1, len(meetings) // 20)]
+    events = list()
+    for _ in range(logins):
+        meeting = rnd.choice(popular if rnd.random() < 0.8 else meetings)
+        body = {"current_page": f"https://{HOSTNAME}/{meeting['recording_path']}/"}
+        if "password" in meeting:
+            body["password"] = meeting["password"]
+        events.append(
+            {
+                "body": json.dumps(body),
+                "headers": {"content-type": "application/json"},
+            }
+        )
+    return lambda: _run_logins(authn_check.handler, events)
+
+
+def _run_logins(handler, events):
+    statuses = Counter()
+    for event in events:
+        response = handler(event, _context())
+        statuses[
+            response.get("statusCode", 200) if isinstance(response, dict) else 200
+        ] += 1
+    return {"status_codes": dict(statuses)}
+
+
+def run_size(size, args):
+    """Seed a table of `size` meetings and run every benchmark against it
+
+    :returns: list of measurement dictionaries
+    """
+    os.environ.update(BENCHMARK_ENVIRONMENT)
+    os.environ["LAMBDA_TASK_ROOT"] = make_task_root()
+    os.environ.setdefault("SCAN_SEGMENTS", str(args.scan_segments))
+    sys.path.insert(0, REPO_ROOT)
+
+    import logging
+
+    from moto import mock_aws
+
+    recorder = CallRecorder()
+    recorder.install()
+    results = list()
+    with mock_aws():
+        meetings = list(synthetic_meetings(size, args.organizations, args.topics))
+        os.environ["CLOUDFRONT_ID"] = create_resources(meetings)
+
+        ## Keep handler logging from dominating the measurements
+        logging.disable(logging.CRITICAL if args.quiet else logging.NOTSET)
+        benchmarks = [
+            ("rebuild_site full", bench_rebuild_site, {"mode": "full"}),
+            ("rebuild_site full (unchanged)", bench_rebuild_site, {"mode": "full"}),
+            ("rebuild_site incremental", bench_rebuild_site, {"mode": "incremental"}),
+            (
+                "queue_receiver batch of 10",
+                bench_queue_receiver,
+                list(
+                    synthetic_meetings(
+                        10, args.organizations, args.topics, seed=size, first=size
+                    )
+                ),
+            ),
+            ("auth_check logins", bench_auth_check, meetings, args.logins),
+        ]
+        for name, function, *bench_args in benchmarks:
+            if args.only and not any(name.startswith(o) for o in args.only):
+                continue
+            report = measure(name, recorder, function, *bench_args)
+            report["table_size"] = size
+            results.append(report)
+            print(_format_report(report), flush=True)
+    return results
+
+
+def _format_report(report):
+    calls = ", ".join(f"{k}={v}" for k, v in report["api_calls"].items())
+    return (
+        f"[{report['table_size']:>7}] {report['benchmark']:<32} "
+        f"{report['wall_seconds']:>8.2f}s  "
+        f"rss={report['peak_rss_kb'] / 1024:.0f}MB  "
+        f"rcu~{report['dynamodb_rcu_estimate']:.1f}  "
+        f"puts={report['s3_puts']} ({report['s3_put_bytes'] / 1024:.0f}KB)  "
+        f"invalidations={report['invalidation_paths']}  "
+        f"calls: {calls}"
+    )
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000])
+    parser.add_argument("--organizations", type=int, default=5)
+    parser.add_argument("--topics", type=int, default=20, help="per organization")
+    parser.add_argument("--logins", type=int, default=200)
+    parser.add_argument("--scan-segments", type=int, default=4)
+    parser.add_argument(
+        "--only", nargs="+", help="run only benchmarks whose names start with these"
+    )
+    parser.add_argument("--output", help="write the measurements as JSON to this file")
+    parser.add_argument("--verbose", dest="quiet", action="store_false")
+    args = parser.parse_args(argv)
+
+    context = multiprocessing.get_context("spawn")
+    results = list()
+    for size in args.sizes:
+        with context.Pool(1) as pool:
+            results.extend(pool.apply(run_size, (size, args)))
+
+    if args.output:
+        with open(args.output, "w") as fp:
+            json.dump(results, fp, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,28 +1,128 @@
+import functools
 import os
 
 import boto3
-import jinja2
+
+from .util.state_store import LocalStateStore, S3StateStore
 
 
 class Params:
-    pass
+    """
+    Configuration and AWS clients shared by the handlers.  Clients are created
+    the first time they are used, so each function only pays for what it
+    touches during its cold start.
+    """
 
+    def __init__(self):
+        self.uploader = None
+        self.manifest = None
+        self.cache_invalidations = list()
 
-params = Params()
+    @functools.cached_property
+    def MEETINGS_TABLE_ARN(self):
+        return os.environ["MEETINGS_TABLE_ARN"]
+
+    @functools.cached_property
+    def table_name(self):
+        return self.MEETINGS_TABLE_ARN.split(":")[-1].split("/")[-1]
+
+    @functools.cached_property
+    def metrics(self):
+        from .util.metrics import StageMetrics
+
+        return StageMetrics(os.environ.get("METRICS_NAMESPACE", "RecordingsSite"))
+
+    @functools.cached_property
+    def dynamodb(self):
+        resource = boto3.resource("dynamodb")
+        self.metrics.instrument(resource.meta.client)
+        return resource
+
+    @functools.cached_property
+    def meetings_table(self):
+        return self.dynamodb.Table(self.table_name)
+
+    @functools.cached_property
+    def WEBSITE_BUCKET(self):
+        return os.environ["WEBSITE_BUCKET"]
+
+    @functools.cached_property
+    def s3(self):
+        resource = boto3.resource("s3")
+        self.metrics.instrument(resource.meta.client)
+        return resource
+
+    @functools.cached_property
+    def PAGE_ENCODING(self):
+        return os.environ.get("PAGE_ENCODING") or None
+
+    @functools.cached_property
+    def UPLOAD_BACKEND(self):
+        return os.environ.get("UPLOAD_BACKEND") or "threads"
+
+    @functools.cached_property
+    def state_store(self):
+        if "STATE_DIR" in os.environ:
+            return LocalStateStore(os.environ["STATE_DIR"])
+        return S3StateStore(self.s3, self.WEBSITE_BUCKET)
+
+    @functools.cached_property
+    def organization_topics(self):
+        from .util.rollups import OrganizationTopics
+
+        return OrganizationTopics(self.state_store)
 
-params.MEETINGS_TABLE_ARN = os.environ["MEETINGS_TABLE_ARN"]
-params.table_name = params.MEETINGS_TABLE_ARN.split(":")[-1].split("/")[-1]
-params.dynamodb = boto3.resource("dynamodb")
-params.meetings_table = params.dynamodb.Table(params.table_name)
-
-params.WEBSITE_BUCKET = os.environ["WEBSITE_BUCKET"]
-params.s3 = boto3.resource("s3")
-params.j2_env = jinja2.Environment(
-    loader=jinja2.FileSystemLoader(
-        searchpath=f"{os.environ['LAMBDA_TASK_ROOT']}/page_templates"
-    )
-)
-
-params.CLOUDFRONT_ID = os.environ["CLOUDFRONT_ID"]
-params.cloudfront = boto3.client("cloudfront")
-params.cache_invalidations = list()
+    @functools.cached_property
+    def topic_listings(self):
+        from .util.rollups import TopicListings
+
+        return TopicListings(self.state_store)
+
+    @functools.cached_property
+    def invalidations(self):
+        from .util.invalidations import InvalidationBatcher
+
+        return InvalidationBatcher(
+            self.state_store,
+            window=int(os.environ.get("INVALIDATION_WINDOW", 300)),
+            path_budget=int(os.environ.get("INVALIDATION_PATH_BUDGET", 1000)),
+        )
+
+    @functools.cached_property
+    def j2_env(self):
+        from .util.templates import template_environment
+
+        return template_environment()
+
+    @functools.cached_property
+    def NOTIFY_WEBBUILDER_QUEUE_ARN(self):
+        return os.environ["NOTIFY_WEBBUILDER_QUEUE_ARN"]
+
+    @functools.cached_property
+    def sqs(self):
+        resource = boto3.resource("sqs")
+        self.metrics.instrument(resource.meta.client)
+        return resource
+
+    @functools.cached_property
+    def notify_queue(self):
+        # The queue URL follows from the ARN (arn:aws:sqs:region:account:name),
+        # which saves a GetQueueUrl round trip
+        *_, account_id, queue_name = self.NOTIFY_WEBBUILDER_QUEUE_ARN.split(":")
+        endpoint_url = self.sqs.meta.client.meta.endpoint_url
+        return self.sqs.Queue(f"{endpoint_url}/{account_id}/{queue_name}")
+
+    @functools.cached_property
+    def CLOUDFRONT_ID(self):
+        return os.environ["CLOUDFRONT_ID"]
+
+    @functools.cached_property
+    def cloudfront(self):
+        return self.metrics.instrument(boto3.client("cloudfront"))
+
+    @functools.cached_property
+    def lambda_client(self):
+        return self.metrics.instrument(boto3.client("lambda"))
+
+
+params = Params()
@@ -1,4 +1,6 @@
 import functools
+import hashlib
+import hmac
 import json
 import os
 import re
@@ -14,7 +16,15 @@ from botocore.exceptions import ClientError
 from botocore.signers import CloudFrontSigner
 
 from . import params
+from .util.cache import TTLCache
 from .util.log_config import setup_logging
+from .util.metrics import report_metrics
+
+try:
+    from cryptography.hazmat.primitives import hashes, serialization
+    from cryptography.hazmat.primitives.asymmetric import padding
+except ImportError:  # Fall back to the pure-Python `rsa` package
+    serialization = None
 
 
 class CloudFrontUtil:
@@ -32,12 +42,22 @@ class CloudFrontUtil:
         self.key_id = key_id
 
         with open(private_key_path, "rb") as fp:
-            priv_key = rsa.PrivateKey.load_pkcs1(fp.read())
+            key_data = fp.read()
 
         # NOTE: CloudFront use RSA-SHA1 for signing URLs or cookies
-        self.rsa_signer = functools.partial(
-            rsa.sign, priv_key=priv_key, hash_method="SHA-1"
-        )
+        if serialization is not None:
+            # `cryptography` signs with OpenSSL, far faster than pure-Python `rsa`
+            priv_key = serialization.load_pem_private_key(key_data, password=None)
+            self.rsa_signer = functools.partial(
+                priv_key.sign,
+                padding=padding.PKCS1v15(),
+                algorithm=hashes.SHA1(),
+            )
+        else:
+            priv_key = rsa.PrivateKey.load_pkcs1(key_data)
+            self.rsa_signer = functools.partial(
+                rsa.sign, priv_key=priv_key, hash_method="SHA-1"
+            )
         self.cf_signer = CloudFrontSigner(key_id, self.rsa_signer)
 
     def generate_presigned_url(self, url: str, expire_at: datetime) -> str:
@@ -58,6 +78,32 @@ class CloudFrontUtil:
         }
 
 
+@functools.lru_cache(maxsize=None)
+def cloudfront_util(private_key_path, key_id):
+    """Get the signer for a key, loading the key at most once per container
+
+    :param private_key_path: str, the path of the private key
+    :param key_id: str, CloudFront public key id
+
+    :returns: CloudFrontUtil
+    """
+    return CloudFrontUtil(private_key_path, key_id)
+
+
+## recording_path -> meeting metadata, reused across warm invocations so
+## repeated logins to a popular recording skip DynamoDB
+_meeting_cache = TTLCache(
+    maxsize=int(os.environ.get("MEETING_CACHE_SIZE", 256)),
+    ttl=int(os.environ.get("MEETING_CACHE_TTL", 300)),
+)
+
+
+def _password_hash(password):
+    if password is None:
+        return None
+    return hashlib.sha256(str(password).encode("utf-8")).hexdigest()
+
+
 extract_recording_path_RE = re.compile("https://[^/]+/(.*?)(/|/index\.html)?$")
 
 
@@ -84,6 +130,7 @@ def response_wrap(content=None, error=None, statusCode=200):
     return response
 
 
+@report_metrics
 def handler(event, context):
     setup_logging()
     aws_request_id = "*NO CONTEXT*" if context is None else context.aws_request_id
@@ -93,6 +140,7 @@ def handler(event, context):
 
     ##STAGE Read form content
     stage = "Read form content"
+    params.metrics.enter(stage)
     if "body" in event:
         body = event["body"]
     else:
@@ -119,6 +167,7 @@ def handler(event, context):
 
     ##STAGE Look up meeting
     stage = "Look up meeting"
+    params.metrics.enter(stage)
     extract_recording_path_match = extract_recording_path_RE.match(current_page)
     if (recording_path := extract_recording_path_match.group(1)) is None:
         params.log.warn(stage, reason="recording_path regex not found", event=event)
@@ -127,44 +176,53 @@ def handler(event, context):
             statusCode=500,
         )
 
-    response = params.meetings_table.scan(
-        IndexName="path-index",
-        Select="ALL_PROJECTED_ATTRIBUTES",
-        FilterExpression=Key("recording_path").eq(recording_path),
-    )
-    params.log.debug(
-        stage,
-        reason="Retrieved results",
-        recording_path=recording_path,
-        response=response,
-    )
-    try:
-        meetings = response["Items"]
-    except BaseException as err:
-        params.log.error(stage, "Invalid response", exception=err, response=response)
-        return response_wrap(
-            error=f"AWS returned bad info. This should not happen. {aws_request_id=}",
-            statusCode=500,
+    if (meeting := _meeting_cache.get(recording_path)) is None:
+        ## Limit=2 is enough to tell a unique path from a duplicated one
+        response = params.meetings_table.query(
+            IndexName="path-index",
+            Select="ALL_PROJECTED_ATTRIBUTES",
+            KeyConditionExpression=Key("recording_path").eq(recording_path),
+            Limit=2,
         )
-    if not meetings:
-        params.log.warn(
+        params.log.debug(
             stage,
-            reason="NONE FOUND",
-            get_item_response=response,
+            reason="Retrieved results",
             recording_path=recording_path,
+            response=response,
         )
-        return response_wrap(
-            error=f"This meeting could not be found. This should not happen. {aws_request_id=}",
-            statusCode=500,
-        )
-    if len(meetings) > 1:
-        params.log.error(stage, reason="TOO MANY FOUND", get_item_response=response)
-        return response_wrap(
-            error=f"Too many meetings found in database. This should not happen. {aws_request_id=}",
-            statusCode=500,
-        )
+        try:
+            meetings = response["Items"]
+        except BaseException as err:
+            params.log.error(
+                stage, "Invalid response", exception=err, response=response
+            )
+            return response_wrap(
+                error=f"AWS returned bad info. This should not happen. {aws_request_id=}",
+                statusCode=500,
+            )
+        if not meetings:
+            params.log.warn(
+                stage,
+                reason="NONE FOUND",
+                get_item_response=response,
+                recording_path=recording_path,
+            )
+            return response_wrap(
+                error=f"This meeting could not be found. This should not happen. {aws_request_id=}",
+                statusCode=500,
+            )
+        if len(meetings) > 1:
+            params.log.error(stage, reason="TOO MANY FOUND", get_item_response=response)
+            return response_wrap(
+                error=f"Too many meetings found in database. This should not happen. {aws_request_id=}",
+                statusCode=500,
+            )
+        meeting = {"password_hash": _password_hash(meetings[0].get("password"))}
+        _meeting_cache.set(recording_path, meeting)
+    else:
+        params.log.debug(stage, reason="Cache hit", recording_path=recording_path)
 
-    if (meeting_password := meetings[0].get("password")) is not None:
+    if (meeting_password_hash := meeting["password_hash"]) is not None:
         ## The meeting has a password; see if we got a password string from the form
         if "password" not in body:
             params.log.warn(stage, reason="No password parameter", http_event=event)
@@ -172,11 +230,12 @@ def handler(event, context):
                 error="The form submission did not include a password. Please try again.",
                 statusCode=400,
             )
-        if meeting_password != body["password"]:
+        if not hmac.compare_digest(
+            meeting_password_hash, _password_hash(body["password"])
+        ):
             params.log.info(
                 stage,
                 reason="Password mismatch",
-                meeting_password=meeting_password,
                 body_password=body["password"],
             )
             return response_wrap(
@@ -186,18 +245,20 @@ def handler(event, context):
 
     ##STAGE Get signed cookies
     stage = "Get signed cookies"
+    params.metrics.enter(stage)
     private_key_path = f"{os.environ['LAMBDA_TASK_ROOT']}/keys/private_key.pem"
     key_id = os.environ["PUBLIC_KEY_ID"]
     url = f'https://{os.environ["HOSTNAME"]}/{recording_path}*'
     expire_at = datetime.now() + timedelta(days=1)
 
-    cfu = CloudFrontUtil(private_key_path, key_id)
+    cfu = cloudfront_util(private_key_path, key_id)
 
     signed_cookies = cfu.generate_signed_cookies(url, expire_at)
     params.log.debug(stage, reason="Signed cookies", signed_cookies=signed_cookies)
 
     ##STAGE Generate Response
     stage = "Generate response"
+    params.metrics.enter(stage)
     response = json.dumps(signed_cookies, indent=4)
     params.log.debug(stage, reason="Generated response", response=response)
     return response
@@ -0,0 +1,296 @@
+"""
+Build the whole site on a workstation and push the result to the website bucket
+
+    python -m serverless_recordings_site.build_site build --input meetings.jsonl --output site.tar.gz
+    python -m serverless_recordings_site.build_site sync site.tar.gz
+
+`build` renders every page across a pool of processes into a directory,
+tarball or zip file; it needs AWS access only to scan the meetings table
+(`--scan`).  `sync` uploads the pages of a build whose content differs from
+what the page manifest says is in the bucket, then invalidates them.
+"""
+import argparse
+import functools
+import json
+import multiprocessing
+import os
+import tempfile
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+import structlog
+from boto3.dynamodb.types import TypeDeserializer
+
+from . import params
+from .util.aws_helpers import scan_table
+from .util.change_feed import MEETING_PROJECTION
+from .util.html_pages import (
+    create_meeting_page,
+    create_organization_page,
+    create_search_index,
+    create_topic_page,
+    sync_static_pages,
+)
+from .util.log_config import setup_logging
+from .util.manifest import PageManifest
+from .util.rollups import OrganizationTopics
+from .util.site_archive import SiteReader, SiteWriter
+from .util.state_store import LocalStateStore
+from .util.upload_pipeline import upload_pipeline
+
+## Meetings rendered by one worker task
+MEETING_BATCH_SIZE = 500
+
+
+def load_meetings(path):
+    """Read meetings from an export file
+
+    The file may hold a JSON list of meetings, the output of `aws dynamodb
+    scan` (`{"Items": [...]}`), or one meeting per line, either plain or as a
+    DynamoDB export to S3 writes them (`{"Item": {...}}`).
+
+    :param path: file name
+
+    :returns: generator of meeting dictionaries
+    """
+    deserializer = TypeDeserializer()
+
+    def _meeting(item, typed=False):
+        if "Item" in item:
+            item, typed = item["Item"], True
+        if typed:
+            return {k: deserializer.deserialize(v) for k, v in item.items()}
+        return item
+
+    with open(path) as fp:
+        content = fp.read()
+    try:
+        items = json.loads(content)
+    except json.JSONDecodeError:
+        for line in content.splitlines():
+            if line.strip():
+                yield _meeting(json.loads(line))
+        return
+    if isinstance(items, dict):
+        yield from (_meeting(item, typed=True) for item in items.get("Items", []))
+    else:
+        yield from (_meeting(item) for item in items)
+
+
+def scan_meetings(total_segments=1):
+    """Read meetings from the meetings table
+
+    :param total_segments: number of DynamoDB parallel scan segments
+
+    :returns: generator of meeting dictionaries
+    """
+    for _, meetings, _ in scan_table(
+        total_segments=total_segments, ProjectionExpression=MEETING_PROJECTION
+    ):
+        yield from meetings
+
+
+class _PageCollector:
+    """
+    Stand-in for `UploadPipeline` in the worker processes, holding the pages
+    of one task until they are sent back to the writer.
+    """
+
+    multipart = False
+
+    def __init__(self):
+        self.pages = list()
+
+    def submit(self, key, body, on_success=None, **put_kwargs):
+        self.pages.append((key, body, put_kwargs))
+        if on_success is not None:
+            on_success()
+
+
+class _DiscardedListings:
+    """
+    Stand-in for `TopicListings` in the worker processes: topic listings
+    belong to the bucket's state, not to the build, so they are not kept.
+    """
+
+    def save(self, org, topic, latest, years, year_meetings):
+        pass
+
+
+def _init_worker():
+    setup_logging()
+    params.log = structlog.get_logger()
+    params.manifest = None
+    params.topic_listings = _DiscardedListings()
+
+
+def _render(render, *args, **kwargs):
+    params.uploader = _PageCollector()
+    try:
+        render(*args, **kwargs)
+        return params.uploader.pages
+    finally:
+        params.uploader = None
+        params.cache_invalidations = list()
+
+
+def _render_meetings(meetings):
+    for meeting in meetings:
+        create_meeting_page(meeting_document=meeting)
+
+
+def _bounded(pool, tasks, limit):
+    """Run tasks on a pool with at most `limit` of them unfinished
+
+    :returns: generator of finished futures
+    """
+    pending = set()
+    for task in tasks:
+        pending.add(pool.submit(_render, *task))
+        if len(pending) >= limit:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            yield from done
+    while pending:
+        done, pending = wait(pending, return_when=FIRST_COMPLETED)
+        yield from done
+
+
+def build_site(meetings, target, processes=None):
+    """Render every page of the site into a local artifact
+
+    :param meetings: iterable of meeting dictionaries
+    :param target: file or directory name of the artifact (see `SiteWriter`)
+    :param processes: number of rendering processes (default: one per CPU)
+
+    :returns: dictionary of statistics
+    """
+    ##STAGE Build site
+    stage = "Build site"
+    processes = processes or os.cpu_count()
+    params.manifest = None
+    ## organization -> meeting topic -> meetings
+    meetings_index = dict()
+
+    def _tasks():
+        batch = list()
+        for meeting in meetings:
+            topics = meetings_index.setdefault(meeting["organization"], dict())
+            topics.setdefault(meeting["meeting_topic"], list()).append(
+                {
+                    "start_time": meeting["start_time"],
+                    "recording_path": meeting["recording_path"],
+                }
+            )
+            batch.append(meeting)
+            if len(batch) >= MEETING_BATCH_SIZE:
+                yield _render_meetings, batch
+                batch = list()
+        if batch:
+            yield _render_meetings, batch
+        for organization, topics in meetings_index.items():
+            for topic, topic_meetings in topics.items():
+                yield create_topic_page, organization, topic, topic_meetings
+
+    ## Organization topic summaries belong to the bucket's state, not the build
+    with tempfile.TemporaryDirectory() as state_dir, SiteWriter(target) as writer:
+        params.organization_topics = OrganizationTopics(LocalStateStore(state_dir))
+        params.uploader = writer
+        try:
+            sync_static_pages()
+            ## `meetings` may be a scan running on threads, which a forked
+            ## worker would inherit mid-flight, locks and all
+            with ProcessPoolExecutor(
+                processes,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_init_worker,
+            ) as pool:
+                for future in _bounded(pool, _tasks(), limit=processes * 4):
+                    for key, body, put_kwargs in future.result():
+                        writer.submit(key, body, **put_kwargs)
+            for organization, topics in meetings_index.items():
+                create_organization_page(organization, topics=topics)
+                create_search_index(organization, topics, replace=True)
+        finally:
+            params.uploader = None
+            params.cache_invalidations = list()
+            del params.organization_topics
+    params.log.info(
+        stage, reason="Site built", target=target, processes=processes, **writer.stats
+    )
+    return writer.stats
+
+
+def sync_site(target, upload_workers=8):
+    """Upload the pages of a build that differ from those in the website bucket
+
+    Pages are compared by the digests (of content and metadata) in the page
+    manifest.  Pages in the bucket that are missing from the build are left
+    alone.
+
+    :param target: file or directory name of the artifact
+    :param upload_workers: number of concurrent S3 uploads
+
+    :returns: number of pages uploaded
+    """
+    ##STAGE Sync site
+    stage = "Sync site"
+    params.manifest = PageManifest(params.state_store)
+    with SiteReader(target) as site, upload_pipeline(upload_workers) as uploader:
+        for key, metadata in sorted(site.manifest.items()):
+            metadata = dict(metadata)
+            digest = metadata.pop("digest")
+            if params.manifest.unchanged(key, digest):
+                continue
+            uploader.submit(
+                key,
+                site.read(key),
+                on_success=functools.partial(params.manifest.record, key, digest),
+                **metadata,
+            )
+            params.cache_invalidations.append(key)
+    uploaded = params.manifest.save()
+    params.log.info(
+        stage,
+        reason="Site synced",
+        uploaded=uploaded,
+        unchanged=params.manifest.skipped,
+    )
+
+    sync_id = f"build-sync-{int(time.time())}"
+    params.invalidations.defer(sync_id, params.cache_invalidations)
+    params.cache_invalidations = list()
+    params.invalidations.flush(sync_id, force=True)
+    return uploaded
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0].strip())
+    commands = parser.add_subparsers(dest="command", required=True)
+    build = commands.add_parser("build", help="render the site to a local artifact")
+    source = build.add_mutually_exclusive_group(required=True)
+    source.add_argument("--input", help="JSON or JSON Lines export of meetings")
+    source.add_argument(
+        "--scan", action="store_true", help="scan the meetings table instead"
+    )
+    build.add_argument("--scan-segments", type=int, default=4)
+    build.add_argument("--output", required=True, help="directory, .tar[.gz] or .zip")
+    build.add_argument("--processes", type=int, default=None)
+    sync = commands.add_parser("sync", help="upload a build's changed pages")
+    sync.add_argument("target", help="directory, .tar[.gz] or .zip made by `build`")
+    sync.add_argument("--upload-workers", type=int, default=8)
+    args = parser.parse_args(argv)
+
+    setup_logging()
+    params.log = structlog.get_logger()
+    if args.command == "build":
+        if args.input:
+            meetings = load_meetings(args.input)
+        else:
+            meetings = scan_meetings(args.scan_segments)
+        build_site(meetings, args.output, args.processes)
+    else:
+        sync_site(args.target, args.upload_workers)
+
+
+if __name__ == "__main__":
+    main()
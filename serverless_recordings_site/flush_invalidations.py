@@ -0,0 +1,23 @@
+import structlog
+
+from . import params
+from .util.log_config import setup_logging
+from .util.metrics import report_metrics
+
+
+@report_metrics
+def handler(event, context):
+    setup_logging()
+    aws_request_id = "*NO CONTEXT*" if context is None else context.aws_request_id
+    params.log = structlog.get_logger()
+    params.log = params.log.bind(aws_request_id=aws_request_id)
+    params.log.info("STARTED", flush_event=event)
+
+    ##STAGE Create CloudFront invalidation
+    stage = "Create CloudFront invalidation"
+    params.metrics.enter(stage)
+    ## Runs on a schedule so paths deferred by the last queue messages of a
+    ## burst are not left waiting for the next message to arrive
+    response = params.invalidations.flush(aws_request_id)
+    params.log.debug(stage, reason="Cache invalidated", response=response)
+    return
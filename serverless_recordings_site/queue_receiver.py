@@ -1,35 +1,18 @@
 import json
 import os
 
-import boto3
 import structlog
 
 from . import params
-from .util.aws_helpers import invalidate_cache
 from .util.html_pages import (
     create_meeting_page,
-    create_organization_page,
-    create_topic_page,
+    create_search_index,
+    update_organization_page,
+    update_topic_page,
 )
 from .util.log_config import setup_logging
-
-response = params.s3.Object(params.WEBSITE_BUCKET, "login.html").upload_file(
-    f"{os.environ['LAMBDA_TASK_ROOT']}/site_html/login.html",
-    ExtraArgs={"ContentType": "text/html"},
-)
-print(f"Upload login file to S3 bucket: {response=}")
-
-## This function will interact directly with the notification queue for events from the receive-recording Lambda
-NOTIFY_WEBBUILDER_QUEUE_ARN = os.environ["NOTIFY_WEBBUILDER_QUEUE_ARN"]
-queue_name = NOTIFY_WEBBUILDER_QUEUE_ARN.split(":")[-1]
-account_id = NOTIFY_WEBBUILDER_QUEUE_ARN.split(":")[-2]
-sqs_client = boto3.client("sqs")
-queue_url_response = sqs_client.get_queue_url(
-    QueueName=queue_name,
-    QueueOwnerAWSAccountId=account_id,
-)
-sqs = boto3.resource("sqs")
-webbuilder_notify = sqs.Queue(queue_url_response["QueueUrl"])
+from .util.manifest import PageManifest
+from .util.metrics import report_metrics
 
 
 def _load_template(template):
@@ -40,37 +23,129 @@ def _load_template(template):
     return params.j2_env.get_template(template)
 
 
+@report_metrics
 def handler(event, context):
     setup_logging()
     aws_request_id = "*NO CONTEXT*" if context is None else context.aws_request_id
     params.log = structlog.get_logger()
     params.log = params.log.bind(aws_request_id=aws_request_id)
     params.log.info("STARTED", queue_event=event)
+    base_log = params.log
 
     ##STAGE Process queue message
     stage = "Process queue message"
+    params.metrics.enter(stage)
+    params.manifest = PageManifest(params.state_store)
+    ## (organization, meeting topic) -> ids of the messages that touched it
+    dirty_topics = dict()
+    ## organization -> meeting topic -> new meetings, merged into the topic
+    ## listings and the search index
+    new_meetings = dict()
+    failed_message_ids = set()
     for message in event["Records"]:
+        params.log = base_log
         params.log.debug(stage, reason="Received message", message=message)
-        body = json.loads(message["body"])
-        params.log = params.log.bind(recording_id=body["recording_id"])
-        params.log.info(stage, reason="Processing message", message_body=body)
+        try:
+            body = json.loads(message["body"])
+            params.log = base_log.bind(recording_id=body["recording_id"])
+            params.log.info(stage, reason="Processing message", message_body=body)
+            ## A copy, as the page rewrites the times the rollups are built from
+            create_meeting_page(dict(body))
+        except Exception as e:
+            params.log.error(
+                stage, reason="Message failed", exception=e, message=message
+            )
+            failed_message_ids.add(message["messageId"])
+            continue
+        ## Only meetings whose page was created are rolled up, so a bad
+        ## message fails alone instead of taking its topic down with it
+        dirty_topics.setdefault(
+            (body["organization"], body["meeting_topic"]), list()
+        ).append(message["messageId"])
+        new_meetings.setdefault(body["organization"], dict()).setdefault(
+            body["meeting_topic"], list()
+        ).append(
+            {
+                "start_time": body["start_time"],
+                "recording_path": body["recording_path"],
+            }
+        )
+    params.log = base_log
 
-        create_meeting_page(body)
-        create_topic_page(body["organization"], body["meeting_topic"])
-        create_organization_page(body["organization"])
+    ##STAGE Create rollup pages
+    stage = "Create rollup pages"
+    params.metrics.enter(stage)
+    ## organization -> ids of the messages that touched it, and their topics
+    dirty_organizations = dict()
+    organization_topics = dict()
+    for (organization, topic), message_ids in dirty_topics.items():
+        dirty_organizations.setdefault(organization, list()).extend(message_ids)
+        organization_topics.setdefault(organization, set()).add(topic)
+        try:
+            update_topic_page(organization, topic, new_meetings[organization][topic])
+        except Exception as e:
+            params.log.error(
+                stage, reason="Topic page failed", exception=e, topic=topic
+            )
+            failed_message_ids.update(message_ids)
+    for organization, message_ids in dirty_organizations.items():
+        try:
+            update_organization_page(organization, organization_topics[organization])
+        except Exception as e:
+            params.log.error(
+                stage,
+                reason="Organization page failed",
+                exception=e,
+                organization=organization,
+            )
+            failed_message_ids.update(message_ids)
+        try:
+            create_search_index(organization, new_meetings[organization])
+        except Exception as e:
+            params.log.error(
+                stage,
+                reason="Search index failed",
+                exception=e,
+                organization=organization,
+            )
+            failed_message_ids.update(message_ids)
 
-        message_to_delete = {
-            "Id": message["messageId"],
-            "ReceiptHandle": message["receiptHandle"],
-        }
-        response = webbuilder_notify.delete_messages(Entries=[message_to_delete])
-        params.log.debug(
-            stage, reason="Deleted message", response=response, message=message
+    ##STAGE Delete processed messages
+    stage = "Delete processed messages"
+    params.metrics.enter(stage)
+    messages_to_delete = [
+        {"Id": message["messageId"], "ReceiptHandle": message["receiptHandle"]}
+        for message in event["Records"]
+        if message["messageId"] not in failed_message_ids
+    ]
+    ## SQS accepts at most ten entries per batch
+    for i in range(0, len(messages_to_delete), 10):
+        response = params.notify_queue.delete_messages(
+            Entries=messages_to_delete[i : i + 10]
         )
+        params.log.debug(stage, reason="Deleted messages", response=response)
+
+    ##STAGE Update page manifest
+    stage = "Update page manifest"
+    params.metrics.enter(stage)
+    params.log.debug(stage, reason="Saved manifest", updated=params.manifest.save())
 
     ##STAGE Create CloudFront invalidation
     stage = "Create CloudFront invalidation"
-    response = invalidate_cache(aws_request_id)
+    params.metrics.enter(stage)
+    params.invalidations.defer(aws_request_id, params.cache_invalidations)
+    params.cache_invalidations = list()
+    response = params.invalidations.flush(aws_request_id)
     params.log.debug(stage, reason="Cache invalidated", response=response)
 
-    return
+    ## Partial batch response: only the failed messages are retried
+    ## https://docs.aws.amazon.com/lambda/latest/dg/with-sqs.html#services-sqs-batchfailurereporting
+    if failed_message_ids:
+        params.log.warn(
+            stage, reason="Messages failed", message_ids=sorted(failed_message_ids)
+        )
+    return {
+        "batchItemFailures": [
+            {"itemIdentifier": message_id} for message_id in sorted(failed_message_ids)
+        ]
+    }
@@ -1,56 +1,393 @@
+import json
+import os
+import time
+
 import structlog
 
 from . import params
-from .util.aws_helpers import invalidate_cache
+from .util.aws_helpers import scan_table
+from .util.change_feed import (
+    HIGH_WATER_MARK,
+    MEETING_PROJECTION,
+    scan_changes,
+    stream_changes,
+)
+from .util.checkpoint import RebuildCheckpoint
 from .util.html_pages import (
     create_meeting_page,
     create_organization_page,
+    create_search_index,
     create_topic_page,
+    sync_static_pages,
+    update_organization_page,
 )
 from .util.log_config import setup_logging
+from .util.manifest import PageManifest
+from .util.metrics import report_metrics
+from .util.string_constructors import project_year
+from .util.upload_pipeline import upload_pipeline
 
 
-def handler(event, context):
-    setup_logging()
-    aws_request_id = "*NO CONTEXT*" if context is None else context.aws_request_id
-    params.log = structlog.get_logger()
-    params.log = params.log.bind(aws_request_id=aws_request_id)
-    params.log.info("STARTED", queue_event=event)
+def _scan_segments(event):
+    return int(event.get("scan_segments", os.environ.get("SCAN_SEGMENTS", 1)))
+
+
+def _deadline(event, context):
+    """Make a check for whether the invocation should stop and checkpoint
+
+    The time left comes from the Lambda context; without one (a local run),
+    from the event's `time_budget` seconds, if any.  Work stops once the time
+    left falls below the event's `checkpoint_reserve` seconds (default from
+    `CHECKPOINT_RESERVE`), which leaves time to finish the pending uploads and
+    save the checkpoint.
+
+    :param event: Lambda invocation event
+    :param context: Lambda context, or None
+
+    :returns: callable returning True when time is up
+    """
+    reserve = float(
+        event.get("checkpoint_reserve", os.environ.get("CHECKPOINT_RESERVE", 60))
+    )
+    if context is not None:
+        return lambda: context.get_remaining_time_in_millis() / 1000 < reserve
+    if "time_budget" in event:
+        deadline = time.monotonic() + float(event["time_budget"])
+        return lambda: deadline - time.monotonic() < reserve
+    return lambda: False
+
+
+def _render_meeting_pages(checkpoint, out_of_time):
+    """Scan the meetings table and create a page for each meeting
 
+    The scan starts from the segments and keys of the checkpoint, and each
+    page of results is recorded in it once its meeting pages are submitted.
+
+    :param checkpoint: RebuildCheckpoint of the rebuild
+    :param out_of_time: callable returning True when the invocation should stop
+
+    :returns: tuple of the dictionary of organization -> meeting topic ->
+        meetings found by this invocation, and whether the scan is finished
+    """
     ##STAGE Loop through meetings
     stage = "Loop through meetings"
-    discovered_topics = dict()
+    params.metrics.enter(stage)
+    ## organization -> meeting topic -> meetings, so the rollup pages can be
+    ## rendered without going back to DynamoDB
+    meetings_index = dict()
 
-    ## TODO: need to wrap to handle a resumption token
-    response = params.meetings_table.scan(
-        ProjectionExpression="recording_id, start_time, end_time, recording_path, meeting_topic, organization, files",
+    pages = scan_table(
+        total_segments=checkpoint.total_segments,
+        start_keys=checkpoint.start_keys(),
+        segments=checkpoint.pending_segments(),
+        ProjectionExpression=MEETING_PROJECTION,
     )
-    params.log.debug(stage, reason="Retrieved results", response=response)
-    if (meetings := response.get("Items")) is None:
-        params.log.error(stage, reason="NONE FOUND", get_item_response=response)
-        return
+    try:
+        for segment, meetings, last_evaluated_key in pages:
+            params.log.debug(
+                stage,
+                reason="Retrieved results",
+                segment=segment,
+                count=len(meetings),
+                last_evaluated_key=last_evaluated_key,
+            )
+            for meeting in meetings:
+                params.log.debug(stage, reason="Handling meeting", meeting=meeting)
+                topics = meetings_index.setdefault(meeting["organization"], dict())
+                topics.setdefault(meeting["meeting_topic"], list()).append(
+                    {
+                        "start_time": meeting["start_time"],
+                        "recording_path": meeting["recording_path"],
+                    }
+                )
+                ## A copy, as the page rewrites the times the checkpoint records
+                create_meeting_page(meeting_document=dict(meeting))
+            checkpoint.record_page(segment, last_evaluated_key, meetings)
+            if out_of_time():
+                params.log.info(
+                    stage,
+                    reason="Out of time",
+                    pending_segments=checkpoint.pending_segments(),
+                )
+                return meetings_index, False
+    finally:
+        ## Stops the scan threads when the loop ends early
+        pages.close()
+    params.log.info(
+        stage,
+        reason="Found topics",
+        discovered_topics=checkpoint.discovered_topics(),
+    )
+    return meetings_index, True
 
-    for meeting in meetings:
-        params.log.debug(stage, reason="Handling meeting", meeting=meeting)
-        organization = meeting["organization"]
-        topic = meeting["meeting_topic"]
-        if organization not in discovered_topics:
-            discovered_topics[organization] = set()
-        discovered_topics[organization].add(topic)
-        create_meeting_page(meeting_document=meeting)
-    params.log.info(stage, reason="Found topics", discovered_topics=discovered_topics)
 
+def _render_rollup_pages(checkpoint, out_of_time, meetings_index=None):
+    """Create the topic and organization pages of the discovered topics
+
+    :param checkpoint: RebuildCheckpoint of the rebuild
+    :param out_of_time: callable returning True when the invocation should stop
+    :param meetings_index: dictionary of organization -> meeting topic ->
+        meetings of the whole table, if one invocation scanned all of it;
+        otherwise each topic's meetings are queried
+
+    :returns: True if every rollup page is rendered
+    """
     ##STAGE Loop through discovered topics
     stage = "Loop through discovered topics"
-    for organization in discovered_topics:
-        for topic in discovered_topics[organization]:
+    params.metrics.enter(stage)
+    if checkpoint.phase != "rollups":
+        checkpoint.begin_rollups()
+    for organization, topic in checkpoint.pending_topics():
+        if meetings_index is not None:
+            create_topic_page(
+                organization, topic, meetings=meetings_index[organization][topic]
+            )
+        else:
             create_topic_page(organization, topic)
-        create_organization_page(organization)
+        checkpoint.topic_done(organization, topic)
+        if out_of_time():
+            params.log.info(
+                stage,
+                reason="Out of time",
+                pending_topics=len(checkpoint.pending_topics()),
+            )
+            return False
+    for organization, topics in checkpoint.discovered_topics().items():
+        create_organization_page(organization, topics=topics)
+    params.log.debug(stage, reason="Rendered rollup pages")
+    return True
+
+
+def _render_all_pages(checkpoint, out_of_time):
+    """Carry a full rebuild as far as time allows
+
+    :param checkpoint: RebuildCheckpoint of the rebuild
+    :param out_of_time: callable returning True when the invocation should stop
+
+    :returns: True if the rebuild is finished
+    """
+    meetings_index = None
+    if checkpoint.phase == "meetings":
+        whole_table = checkpoint.fresh
+        meetings_index, finished = _render_meeting_pages(checkpoint, out_of_time)
+        ## Each chunk merges its meetings into the search index; a scan of
+        ## the whole table in one invocation replaces it
+        for organization, topics in meetings_index.items():
+            create_search_index(organization, topics, replace=whole_table and finished)
+        if not finished:
+            return False
+        if not whole_table:
+            meetings_index = None
+    return _render_rollup_pages(checkpoint, out_of_time, meetings_index)
+
+
+def _continue_rebuild(event, context, checkpoint):
+    """Start the next invocation of a checkpointed rebuild
+
+    The function invokes itself asynchronously; without a Lambda context the
+    rebuild carries on in this process.
+
+    :param event: Lambda invocation event
+    :param context: Lambda context, or None
+    :param checkpoint: RebuildCheckpoint of the rebuild
+
+    :returns: None
+    """
+    next_event = dict(event, mode="full", resume=checkpoint.run_id)
+    if context is None:
+        handler(next_event, None)
+        return
+    response = params.lambda_client.invoke(
+        FunctionName=context.invoked_function_arn,
+        InvocationType="Event",
+        Payload=json.dumps(next_event).encode("utf-8"),
+    )
+    params.log.debug("Continue rebuild", reason="Invoked next chunk", response=response)
+
+
+def _render_changed_pages(event, high_water_mark):
+    """Create pages for meetings that are new or changed since the last rebuild
+
+    Changes come from a replay of DynamoDB Streams records when the event
+    names a `change_feed` file, after the position reached in each shard.
+    Otherwise they come from a scan for meetings that started after the
+    previous high-water mark, which misses late recordings and edits of
+    older meetings; a full rebuild picks those up.  The topic and
+    organization pages of each changed meeting are re-rendered from the
+    table indexes.
+
+    :param event: Lambda invocation event
+    :param high_water_mark: dictionary of high-water marks from the last rebuild
+
+    :returns: dictionary of high-water marks to store for the next rebuild
+    """
+    ##STAGE Loop through changed meetings
+    stage = "Loop through changed meetings"
+    params.metrics.enter(stage)
+    if change_feed := event.get("change_feed"):
+        sequence_numbers = dict(high_water_mark.get("sequence_numbers", dict()))
+        changes = stream_changes(change_feed, after=sequence_numbers)
+    else:
+        sequence_numbers = None
+        changes = scan_changes(
+            after=high_water_mark.get("start_time"),
+            total_segments=_scan_segments(event),
+        )
+
+    ## organization -> meeting topic -> archive years with changed meetings
+    dirty_topics = dict()
+    ## organization -> meeting topic -> changed meetings, for the search index
+    changed_meetings = dict()
+    latest = None
+    for position, meeting in changes:
+        params.log.debug(stage, reason="Handling meeting", meeting=meeting)
+        dirty_topics.setdefault(meeting["organization"], dict()).setdefault(
+            meeting["meeting_topic"], set()
+        ).add(project_year(meeting["start_time"]))
+        changed_meetings.setdefault(meeting["organization"], dict()).setdefault(
+            meeting["meeting_topic"], list()
+        ).append(
+            {
+                "start_time": meeting["start_time"],
+                "recording_path": meeting["recording_path"],
+            }
+        )
+        create_meeting_page(meeting_document=meeting)
+        if sequence_numbers is not None:
+            shard, sequence_number = position
+            if sequence_number > int(sequence_numbers.get(shard, -1)):
+                sequence_numbers[shard] = str(sequence_number)
+            latest = sequence_numbers
+        elif latest is None or position > latest:
+            latest = position
+    params.log.info(
+        stage,
+        reason="Found changed topics",
+        discovered_topics={org: list(topics) for org, topics in dirty_topics.items()},
+        high_water_mark=latest,
+    )
+
+    ##STAGE Loop through changed topics
+    stage = "Loop through changed topics"
+    params.metrics.enter(stage)
+    for organization, topics in dirty_topics.items():
+        for topic, years in topics.items():
+            create_topic_page(organization, topic, archive_years=sorted(years))
+        update_organization_page(organization, topics)
+        create_search_index(organization, changed_meetings[organization])
+
+    if latest is None:
+        return high_water_mark
+    if sequence_numbers is not None:
+        return dict(high_water_mark, sequence_numbers=sequence_numbers)
+    return dict(high_water_mark, start_time=latest)
+
+
+@report_metrics
+def handler(event, context):
+    setup_logging()
+    aws_request_id = "*NO CONTEXT*" if context is None else context.aws_request_id
+    params.log = structlog.get_logger()
+    params.log = params.log.bind(aws_request_id=aws_request_id)
+    params.log.info("STARTED", queue_event=event)
+    event = event or dict()
+
+    upload_workers = int(
+        event.get("upload_workers", os.environ.get("UPLOAD_WORKERS", 8))
+    )
+    mode = event.get("mode", "full")
+    checkpoint = None
+    if mode == "full":
+        if run_id := event.get("resume"):
+            checkpoint = RebuildCheckpoint.resume(params.state_store, run_id)
+            if checkpoint is None:
+                params.log.warning(
+                    "Resume rebuild", reason="No checkpoint for run", run_id=run_id
+                )
+                return
+        else:
+            checkpoint = RebuildCheckpoint.start(
+                params.state_store, aws_request_id, _scan_segments(event)
+            )
+        params.log.info(
+            "Resume rebuild",
+            reason="Checkpoint loaded",
+            run_id=checkpoint.run_id,
+            invocations=checkpoint.invocations,
+            phase=checkpoint.phase,
+        )
+    finished = True
+    high_water_mark = params.state_store.load(HIGH_WATER_MARK, dict())
+    params.manifest = PageManifest(params.state_store)
+    with upload_pipeline(upload_workers, event.get("upload_backend")) as uploader:
+        params.uploader = uploader
+        try:
+            ##STAGE Sync static pages
+            stage = "Sync static pages"
+            params.metrics.enter(stage)
+            if checkpoint is None or checkpoint.invocations == 0:
+                sync_static_pages()
+            if mode == "static":
+                new_high_water_mark = high_water_mark
+            elif mode == "incremental":
+                new_high_water_mark = _render_changed_pages(event, high_water_mark)
+            else:
+                finished = _render_all_pages(checkpoint, _deadline(event, context))
+                new_high_water_mark = dict(
+                    high_water_mark, start_time=checkpoint.start_time
+                )
+        finally:
+            params.uploader = None
+
+    ##STAGE Update page manifest
+    stage = "Update page manifest"
+    params.metrics.enter(stage)
+    updated = params.manifest.save()
+    params.log.info(
+        stage,
+        reason="Saved manifest",
+        updated=updated,
+        unchanged=params.manifest.skipped,
+    )
 
     ##STAGE Create CloudFront invalidation
     stage = "Create CloudFront invalidation"
-    response = invalidate_cache(aws_request_id)
+    params.metrics.enter(stage)
+    ## Every invocation of a checkpointed rebuild defers its own paths, and
+    ## the last one sends them all
+    if checkpoint is not None:
+        defer_id = f"{checkpoint.run_id}-{checkpoint.invocations}"
+    else:
+        defer_id = aws_request_id
+    params.invalidations.defer(defer_id, params.cache_invalidations)
+    params.cache_invalidations = list()
+    if not finished:
+        ##STAGE Save checkpoint
+        stage = "Save checkpoint"
+        params.metrics.enter(stage)
+        checkpoint.save()
+        params.log.info(
+            stage,
+            reason="Rebuild continues",
+            run_id=checkpoint.run_id,
+            invocations=checkpoint.invocations,
+            phase=checkpoint.phase,
+        )
+        _continue_rebuild(event, context, checkpoint)
+        return
+    response = params.invalidations.flush(aws_request_id, force=True)
     params.log.debug(stage, reason="Cache invalidated", response=response)
+
+    ##STAGE Save high-water mark
+    stage = "Save high-water mark"
+    params.metrics.enter(stage)
+    if new_high_water_mark != high_water_mark:
+        params.state_store.save(HIGH_WATER_MARK, new_high_water_mark)
+    if checkpoint is not None:
+        checkpoint.delete()
+    params.log.info(
+        stage, reason="Rebuild complete", high_water_mark=new_high_water_mark
+    )
     return
 
     # for message in event["Records"]:
@@ -1,19 +1,178 @@
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import boto3
+
 from .. import params
 
+## Beyond this many paths, invalidations are collapsed into wildcards
+MAX_INVALIDATION_PATHS = 10
+
+_SEGMENT_DONE = object()
+
+
+def _scan_segment(table, scan_kwargs, segment=0, total_segments=None, start_key=None):
+    """Follow `LastEvaluatedKey` through every page of one scan segment
+
+    :param table: boto3 DynamoDB Table resource
+    :param scan_kwargs: dictionary of arguments for Table.scan()
+    :param segment: segment number (default=0)
+    :param total_segments: number of segments in a parallel scan (None for a serial scan)
+    :param start_key: `ExclusiveStartKey` to resume from
+
+    :returns: generator of (segment, items, last_evaluated_key) tuples
+    """
+    scan_kwargs = dict(scan_kwargs)
+    if total_segments:
+        scan_kwargs["Segment"] = segment
+        scan_kwargs["TotalSegments"] = total_segments
+    while True:
+        if start_key:
+            scan_kwargs["ExclusiveStartKey"] = start_key
+        response = table.scan(**scan_kwargs)
+        start_key = response.get("LastEvaluatedKey")
+        yield segment, response.get("Items", []), start_key
+        if start_key is None:
+            return
+
+
+def scan_table(
+    total_segments=1, start_keys=None, prefetch_pages=None, segments=None, **scan_kwargs
+):
+    """Iterate over every page of a scan of the meetings table
+
+    With `total_segments` greater than one, a DynamoDB parallel scan is run with
+    one thread per segment.  Pages are handed to the caller as they arrive
+    through a bounded queue, so at most `prefetch_pages` pages are held in
+    memory ahead of the consumer.
+
+    :param total_segments: number of parallel scan segments (default=1)
+    :param start_keys: dictionary of segment number to `ExclusiveStartKey`
+    :param prefetch_pages: maximum pages buffered ahead of the caller
+        (default=twice the number of segments)
+    :param segments: segment numbers to scan, for resuming a scan whose
+        other segments are finished (default=all of them)
+    :param scan_kwargs: passed unmodified to Table.scan()
+
+    :returns: generator of (segment, items, last_evaluated_key) tuples
+    """
+    start_keys = start_keys or dict()
+    segments = list(range(total_segments) if segments is None else segments)
+    if not segments:
+        return
+    if total_segments <= 1:
+        yield from _scan_segment(
+            params.meetings_table, scan_kwargs, 0, start_key=start_keys.get(0)
+        )
+        return
+
+    pages = queue.Queue(maxsize=prefetch_pages or total_segments * 2)
+    stop = threading.Event()
+
+    def _put(item):
+        while not stop.is_set():
+            try:
+                pages.put(item, timeout=0.1)
+                return
+            except queue.Full:
+                continue
+
+    def _worker(segment):
+        try:
+            # boto3 resources are not thread safe, so each segment gets its own
+            dynamodb = boto3.session.Session().resource("dynamodb")
+            params.metrics.instrument(dynamodb.meta.client)
+            table = dynamodb.Table(params.table_name)
+            for page in _scan_segment(
+                table, scan_kwargs, segment, total_segments, start_keys.get(segment)
+            ):
+                _put(page)
+                if stop.is_set():
+                    return
+        except BaseException as err:
+            _put(err)
+        finally:
+            _put(_SEGMENT_DONE)
+
+    with ThreadPoolExecutor(max_workers=len(segments)) as executor:
+        for segment in segments:
+            executor.submit(_worker, segment)
+        running = len(segments)
+        try:
+            while running:
+                page = pages.get()
+                if page is _SEGMENT_DONE:
+                    running -= 1
+                elif isinstance(page, BaseException):
+                    raise page
+                else:
+                    yield page
+        finally:
+            stop.set()
+
+
+def query_table(**query_kwargs):
+    """Iterate over every item returned by a query of the meetings table
+
+    :param query_kwargs: passed unmodified to Table.query()
+
+    :returns: generator of items
+    """
+    while True:
+        response = params.meetings_table.query(**query_kwargs)
+        yield from response.get("Items", [])
+        if (start_key := response.get("LastEvaluatedKey")) is None:
+            return
+        query_kwargs["ExclusiveStartKey"] = start_key
+
+
+def collapse_paths(paths, max_paths=MAX_INVALIDATION_PATHS):
+    """Reduce a set of invalidation paths to at most `max_paths` entries
+
+    Paths are cut back one directory level at a time, each cut replacing the
+    deeper paths with a wildcard on their common prefix (`/org/topic/*`),
+    until the set is small enough.  Only if that still leaves too many paths
+    is the whole distribution invalidated.
+
+    :param paths: iterable of paths, each starting with "/"
+    :param max_paths: largest number of paths to return
+
+    :returns: sorted list of paths
+    """
+    paths = set(paths)
+    depth = max((path.count("/") for path in paths), default=0)
+    while len(paths) > max_paths and depth > 1:
+        depth -= 1
+        collapsed = set()
+        for path in paths:
+            parts = path.split("/")[1:]
+            if len(parts) > depth:
+                path = "/" + "/".join(parts[:depth]) + "/*"
+            collapsed.add(path)
+        paths = collapsed
+    if len(paths) > max_paths:
+        return ["/*"]
+    return sorted(paths)
+
 
-def invalidate_cache(id):
+def invalidate_cache(id, paths=None):
     """Invalidate CloudFront cache
 
     :param id: identifier for this invalidation
+    :param paths: S3 keys of the changed pages (default: take and clear
+        `params.cache_invalidations`)
 
-    :returns: boto3.client.create_invalidation() response
+    :returns: boto3.client.create_invalidation() response, or None if there
+        was nothing to invalidate
     """
-    cache_invalidations = list(dict.fromkeys(params.cache_invalidations))
-    if len(cache_invalidations) < 10:
-        cache_invalidations = ["/" + path for path in cache_invalidations]
-    else:
-        cache_invalidations = ["/*"]
-    params.cache_invalidations = list()
+    if paths is None:
+        paths = params.cache_invalidations
+        params.cache_invalidations = list()
+    cache_invalidations = collapse_paths("/" + path for path in paths)
+    if not cache_invalidations:
+        params.log.debug(reason="No changed pages to invalidate")
+        return None
     invalidation_batch = {
         "Paths": {
             "Quantity": len(cache_invalidations),
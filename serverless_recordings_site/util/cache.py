@@ -0,0 +1,66 @@
+"""
+Small in-container caches that survive across warm Lambda invocations
+"""
+import threading
+import time
+from collections import OrderedDict
+
+
+class TTLCache:
+    """
+    Least-recently-used cache whose entries also expire after a fixed time.
+
+    :param maxsize: number of entries kept before the least recently used is dropped
+    :param ttl: seconds an entry stays valid
+    :param clock: callable returning the current time in seconds
+        (default: :func:`time.monotonic`)
+    """
+
+    def __init__(self, maxsize=128, ttl=300, clock=time.monotonic):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._clock = clock
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key, default=None):
+        """Look up an entry
+
+        :param key: cache key
+        :param default: returned when the key is missing or expired
+
+        :returns: cached value
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] <= self._clock():
+                if entry is not None:
+                    del self._entries[key]
+                self.misses += 1
+                return default
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def set(self, key, value):
+        """Store an entry, evicting the least recently used one if full
+
+        :param key: cache key
+        :param value: value to cache
+
+        :returns: None
+        """
+        with self._lock:
+            self._entries[key] = (self._clock() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
@@ -0,0 +1,87 @@
+"""
+Find the meetings that are new or changed since the last rebuild
+"""
+import json
+
+from boto3.dynamodb.conditions import Attr
+from boto3.dynamodb.types import TypeDeserializer
+
+from .aws_helpers import scan_table
+
+## Name of the state store document holding the high-water marks
+HIGH_WATER_MARK = "rebuild-high-water-mark.json"
+
+## Meeting attributes needed to render meeting, topic and organization pages
+MEETING_PROJECTION = "recording_id, start_time, end_time, recording_path, meeting_topic, organization, files"
+
+
+def _read_stream_records(path):
+    """Read DynamoDB Streams records from a JSON or JSON Lines file
+
+    The file may hold a Lambda stream event (`{"Records": [...]}`), a list of
+    records, or one record per line.
+
+    :param path: file name
+
+    :returns: list of stream records
+    """
+    with open(path) as fp:
+        content = fp.read()
+    try:
+        records = json.loads(content)
+    except json.JSONDecodeError:
+        records = [json.loads(line) for line in content.splitlines() if line.strip()]
+    if isinstance(records, dict):
+        records = records.get("Records", [])
+    return records
+
+
+def stream_changes(path, after=None):
+    """Replay meeting changes from a file of DynamoDB Streams records
+
+    Sequence numbers only increase within a shard, so the position reached
+    is kept for each shard.  A record names its shard in a `shardId` field;
+    Lambda stream events do not carry one, so a file that mixes records from
+    several shards must add it.  Records without it share one position.
+
+    :param path: file of stream records
+    :param after: dictionary of shard ID -> string, sequence number of the
+        last record already handled in that shard
+
+    :returns: generator of ((shard ID, sequence number), meeting document) tuples
+    """
+    deserializer = TypeDeserializer()
+    after = after or dict()
+    for record in _read_stream_records(path):
+        if record.get("eventName") == "REMOVE":
+            continue
+        shard = record.get("shardId", "")
+        stream_record = record["dynamodb"]
+        sequence_number = int(stream_record["SequenceNumber"])
+        if sequence_number <= int(after.get(shard, -1)):
+            continue
+        meeting = {
+            k: deserializer.deserialize(v) for k, v in stream_record["NewImage"].items()
+        }
+        yield (shard, sequence_number), meeting
+
+
+def scan_changes(after=None, total_segments=1):
+    """Scan for meetings that started after a point in time
+
+    This finds new meetings only: a recording of an older meeting that
+    arrives late, or an edit to a meeting already handled, starts before the
+    mark and is not seen.  The filter is applied after the read, so the scan
+    still reads (and is charged for) the whole table.
+
+    :param after: string, Zoom timestamp of the latest meeting already handled
+    :param total_segments: number of parallel scan segments (default=1)
+
+    :returns: generator of (start time, meeting document) tuples
+    """
+    scan_kwargs = {"ProjectionExpression": MEETING_PROJECTION}
+    if after is not None:
+        scan_kwargs["FilterExpression"] = Attr("start_time").gt(after)
+    for _, meetings, _ in scan_table(total_segments=total_segments, **scan_kwargs):
+        for meeting in meetings:
+            yield meeting["start_time"], meeting
@@ -0,0 +1,181 @@
+"""
+Progress of a full rebuild, kept between the Lambda invocations it is split
+across
+"""
+from boto3.dynamodb.types import TypeDeserializer, TypeSerializer
+
+
+class RebuildCheckpoint:
+    """
+    How far a full rebuild has got: the `LastEvaluatedKey` of each scan
+    segment that is not finished, the topics discovered so far, and the
+    rollup pages that are still to be rendered.  A rebuild runs in two
+    phases, `meetings` (scanning the table and rendering meeting pages) and
+    `rollups` (rendering the topic and organization pages).
+
+    :param store: state store holding the checkpoint
+    :param document: checkpoint document, as made by `start()` or `resume()`
+    """
+
+    NAME = "rebuild-checkpoint.json"
+
+    def __init__(self, store, document):
+        self._store = store
+        self._document = document
+
+    @classmethod
+    def start(cls, store, run_id, total_segments):
+        """Begin a new rebuild
+
+        :param store: state store holding the checkpoint
+        :param run_id: identifier shared by every invocation of the rebuild
+        :param total_segments: number of DynamoDB parallel scan segments
+
+        :returns: RebuildCheckpoint
+        """
+        return cls(
+            store,
+            {
+                "run_id": run_id,
+                "phase": "meetings",
+                "invocations": 0,
+                "total_segments": total_segments,
+                "start_keys": dict(),
+                "done_segments": list(),
+                "discovered_topics": dict(),
+                "start_time": None,
+                "pending_topics": list(),
+            },
+        )
+
+    @classmethod
+    def resume(cls, store, run_id):
+        """Pick up a rebuild where the previous invocation left it
+
+        :param store: state store holding the checkpoint
+        :param run_id: identifier of the rebuild
+
+        :returns: RebuildCheckpoint, or None if there is no checkpoint for
+            `run_id` (the rebuild finished, or a newer one replaced it)
+        """
+        document = store.load(cls.NAME)
+        if document is None or document["run_id"] != run_id:
+            return None
+        return cls(store, document)
+
+    @property
+    def run_id(self):
+        return self._document["run_id"]
+
+    @property
+    def phase(self):
+        return self._document["phase"]
+
+    @property
+    def invocations(self):
+        return self._document["invocations"]
+
+    @property
+    def total_segments(self):
+        return self._document["total_segments"]
+
+    @property
+    def start_time(self):
+        return self._document["start_time"]
+
+    @property
+    def fresh(self):
+        """True while no scan page has been recorded"""
+        return not (self._document["start_keys"] or self._document["done_segments"])
+
+    def pending_segments(self):
+        """
+        :returns: list of the scan segments that are not finished
+        """
+        done = set(self._document["done_segments"])
+        return [s for s in range(self.total_segments) if s not in done]
+
+    def start_keys(self):
+        """
+        :returns: dictionary of segment number to `ExclusiveStartKey`
+        """
+        deserializer = TypeDeserializer()
+        return {
+            int(segment): {k: deserializer.deserialize(v) for k, v in key.items()}
+            for segment, key in self._document["start_keys"].items()
+        }
+
+    def record_page(self, segment, last_evaluated_key, meetings):
+        """Note a scan page whose meeting pages have been rendered
+
+        :param segment: scan segment of the page
+        :param last_evaluated_key: `LastEvaluatedKey` of the page, None for
+            the segment's last page
+        :param meetings: meetings of the page
+
+        :returns: None
+        """
+        for meeting in meetings:
+            topics = self._document["discovered_topics"].setdefault(
+                meeting["organization"], list()
+            )
+            if meeting["meeting_topic"] not in topics:
+                topics.append(meeting["meeting_topic"])
+            if self.start_time is None or meeting["start_time"] > self.start_time:
+                self._document["start_time"] = meeting["start_time"]
+        start_keys = self._document["start_keys"]
+        if last_evaluated_key is None:
+            start_keys.pop(str(segment), None)
+            self._document["done_segments"].append(segment)
+        else:
+            ## Key attributes may be numbers, which JSON would turn into floats
+            serializer = TypeSerializer()
+            start_keys[str(segment)] = {
+                k: serializer.serialize(v) for k, v in last_evaluated_key.items()
+            }
+
+    def discovered_topics(self):
+        """
+        :returns: dictionary of organization -> list of meeting topics
+        """
+        return self._document["discovered_topics"]
+
+    def begin_rollups(self):
+        """Move to the `rollups` phase, with every discovered topic pending
+
+        :returns: None
+        """
+        self._document["phase"] = "rollups"
+        self._document["pending_topics"] = sorted(
+            [org, topic]
+            for org, topics in self._document["discovered_topics"].items()
+            for topic in topics
+        )
+
+    def pending_topics(self):
+        """
+        :returns: list of (organization, meeting topic) still to be rendered
+        """
+        return [tuple(pending) for pending in self._document["pending_topics"]]
+
+    def topic_done(self, org, topic):
+        """Note a rendered topic page
+
+        :returns: None
+        """
+        self._document["pending_topics"].remove([org, topic])
+
+    def save(self):
+        """Store the checkpoint for the next invocation
+
+        :returns: None
+        """
+        self._document["invocations"] += 1
+        self._store.save(self.NAME, self._document)
+
+    def delete(self):
+        """Remove the checkpoint once the rebuild is complete
+
+        :returns: None
+        """
+        self._store.delete(self.NAME)
@@ -1,8 +1,415 @@
+import functools
+import hashlib
+import itertools
+import json
+import os
+import types
+import zlib
+from datetime import datetime
+
 from boto3.dynamodb.conditions import Key
 from botocore.exceptions import ClientError
 
 from .. import params
-from .string_constructors import project_time, recording_path
+from .aws_helpers import query_table
+from .manifest import PageManifest
+from .state_store import UPDATE_ATTEMPTS
+from .string_constructors import (
+    project_time,
+    project_times,
+    project_year,
+    recording_path,
+    recording_paths,
+    year_bounds,
+)
+from .templates import TASK_ROOT, get_template
+
+try:
+    import brotli
+except ImportError:  # `PAGE_ENCODING=br` needs the optional `brotli` package
+    brotli = None
+
+## Number of meetings listed on a topic's landing page
+LATEST_MEETINGS = 20
+
+## Cache-Control sent with each kind of page.  Meeting pages are only served
+## to signed-in viewers, so they are kept out of shared caches.  The public
+## archives of past years rarely change, and are invalidated when they do;
+## rollups change with every new recording.
+PAGE_CACHE_CONTROL = {
+    "meeting": "private, max-age=3600",
+    "archive": "public, max-age=86400, s-maxage=31536000",
+    "topic": "public, max-age=300",
+    "organization": "public, max-age=300",
+    "search": "public, max-age=300",
+    "static": "public, max-age=300",
+}
+
+## Pages published as they are: (path under the task root, S3 key)
+STATIC_PAGES = (
+    ("site_html/login.html", "login.html"),
+    ("page_templates/index.html", "index.html"),
+    ("site_html/search.html", "search.html"),
+)
+
+## S3 multipart parts must be at least 5 MiB, except for the last one
+MULTIPART_PART_SIZE = 8 * 1024 * 1024
+
+## S3 error codes of a conditional write that lost to a concurrent one
+CONFLICT_CODES = ("PreconditionFailed", "ConditionalRequestConflict")
+
+
+def _compressor():
+    """Make a streaming compressor for `params.PAGE_ENCODING`
+
+    :returns: object with `compress(data)` and `flush()`, or None to upload
+        pages uncompressed
+    """
+    if params.PAGE_ENCODING == "gzip":
+        ## wbits=31 writes a gzip header with a zero mtime, so identical
+        ## pages compress to identical bytes
+        return zlib.compressobj(9, zlib.DEFLATED, 31)
+    if params.PAGE_ENCODING == "br":
+        if brotli is None:
+            raise RuntimeError("PAGE_ENCODING=br requires the brotli package")
+        compressor = brotli.Compressor(mode=brotli.MODE_TEXT)
+        return types.SimpleNamespace(
+            compress=compressor.process, flush=compressor.finish
+        )
+    return None
+
+
+def _page_metadata(kind, content_type="text/html"):
+    """S3 object metadata for a page
+
+    :param kind: kind of page, a key of `PAGE_CACHE_CONTROL`
+    :param content_type: MIME type of the page
+
+    :returns: dictionary of put_object arguments
+    """
+    metadata = {"ContentType": content_type, "CacheControl": PAGE_CACHE_CONTROL[kind]}
+    if params.PAGE_ENCODING:
+        metadata["ContentEncoding"] = params.PAGE_ENCODING
+    return metadata
+
+
+def _put_page(fname, page, log, stage, kind, content_type="text/html", condition=None):
+    """Compress and upload a rendered page
+
+    :param fname: S3 key of the page
+    :param page: rendered page content (str or bytes)
+    :param log: bound logger of the calling page generator
+    :param stage: stage of the calling page generator
+    :param kind: kind of page, a key of `PAGE_CACHE_CONTROL`
+    :param content_type: MIME type of the page
+    :param condition: `IfMatch` or `IfNoneMatch` put_object argument, as
+        for `_put_body`
+
+    :returns: False if `condition` did not hold, otherwise True
+    """
+    body = page.encode("utf-8") if isinstance(page, str) else page
+    if (compressor := _compressor()) is not None:
+        body = compressor.compress(body) + compressor.flush()
+    return _put_body(
+        fname, body, log, stage, _page_metadata(kind, content_type), condition
+    )
+
+
+def _get_page(fname):
+    """Read back a page from the website bucket, undoing its `Content-Encoding`
+
+    :param fname: S3 key of the page
+
+    :returns: tuple of (page content as bytes, ETag), both None if there is
+        no such page
+    """
+    try:
+        response = params.s3.Object(params.WEBSITE_BUCKET, fname).get()
+    except ClientError as e:
+        if e.response["Error"]["Code"] in ("NoSuchKey", "404"):
+            return None, None
+        raise RuntimeError from e
+    body = response["Body"].read()
+    if response.get("ContentEncoding") == "gzip":
+        body = zlib.decompress(body, 31)
+    elif response.get("ContentEncoding") == "br":
+        body = brotli.decompress(body)
+    return body, response["ETag"]
+
+
+def _merge_page(fname, merge, log, stage, kind, content_type="text/html"):
+    """Merge into a published page, without losing concurrent merges
+
+    The page is read, merged and written back on condition that it has not
+    changed since it was read (its ETag, or its absence).  If another
+    invocation wrote it in between, it is read and merged again.  The write
+    is synchronous, outside `params.uploader`, so the condition holds.
+
+    :param fname: S3 key of the page
+    :param merge: callable taking the published page (bytes, or None if
+        there is none) and returning the merged page (str)
+    :param log: bound logger of the calling page generator
+    :param stage: stage of the calling page generator
+    :param kind: kind of page, a key of `PAGE_CACHE_CONTROL`
+    :param content_type: MIME type of the page
+
+    :returns: None
+    """
+    metadata = _page_metadata(kind, content_type)
+    for _ in range(UPDATE_ATTEMPTS):
+        published, etag = _get_page(fname)
+        page = merge(published).encode("utf-8")
+        if page == published:
+            log.debug(stage, reason="Page unchanged", filename=fname)
+            return
+        body = page
+        if (compressor := _compressor()) is not None:
+            body = compressor.compress(body) + compressor.flush()
+        condition = {"IfNoneMatch": "*"} if etag is None else {"IfMatch": etag}
+        try:
+            response = params.s3.Bucket(params.WEBSITE_BUCKET).put_object(
+                Key=fname, Body=body, **metadata, **condition
+            )
+        except ClientError as e:
+            if e.response["Error"]["Code"] in CONFLICT_CODES:
+                log.debug(stage, reason="Page changed, merging again", filename=fname)
+                continue
+            log.error(stage, reason=str(e), exception=e, filename=fname)
+            raise RuntimeError from e
+        log.debug(stage, reason="Merged page to S3", response=response)
+        if params.manifest is not None:
+            params.manifest.record(fname, PageManifest.digest(body, metadata=metadata))
+        params.cache_invalidations.append(fname)
+        return
+    raise RuntimeError(f"{fname} changed on every one of {UPDATE_ATTEMPTS} tries")
+
+
+def _put_body(fname, body, log, stage, metadata, condition=None):
+    """Upload an encoded page to S3 and queue it for cache invalidation
+
+    Pages whose content and metadata match `params.manifest` are skipped.
+    Pages go through `params.uploader` when an upload pipeline is active,
+    otherwise, or when the write is conditional, they are put synchronously.
+
+    :param fname: S3 key of the page
+    :param body: page content as it is stored in S3
+    :param log: bound logger of the calling page generator
+    :param stage: stage of the calling page generator
+    :param metadata: dictionary of put_object arguments from `_page_metadata`
+    :param condition: `IfMatch` or `IfNoneMatch` put_object argument the
+        write depends on, or None to write unconditionally
+
+    :returns: False if `condition` did not hold, otherwise True
+    """
+    if params.manifest is not None:
+        digest = PageManifest.digest(body, metadata=metadata)
+        if params.manifest.unchanged(fname, digest):
+            log.debug(stage, reason="Page unchanged", filename=fname)
+            return True
+        on_success = functools.partial(params.manifest.record, fname, digest)
+    else:
+        on_success = None
+
+    if params.uploader is not None and (
+        condition is None or not params.uploader.multipart
+    ):
+        ## Writers to local artifacts have nothing to race with
+        params.uploader.submit(fname, body, on_success=on_success, **metadata)
+    else:
+        try:
+            response = params.s3.Bucket(params.WEBSITE_BUCKET).put_object(
+                Key=fname, Body=body, **metadata, **(condition or dict())
+            )
+        except ClientError as e:
+            if condition is not None and e.response["Error"]["Code"] in CONFLICT_CODES:
+                log.debug(stage, reason="Page changed", filename=fname)
+                return False
+            log.error(stage, reason=str(e), exception=e, filename=fname)
+            raise RuntimeError from e
+        log.debug(stage, reason="Put page to S3", response=response)
+        if on_success is not None:
+            on_success()
+    params.cache_invalidations.append(fname)
+    return True
+
+
+def _put_page_stream(fname, chunks, log, stage, kind, condition=None):
+    """Upload a page rendered as a stream of text chunks
+
+    Pages smaller than one multipart part are handed to `_put_body`.  Larger
+    pages go to S3 as a multipart upload, one part at a time, so memory use
+    does not grow with the size of the page.  The upload is abandoned if the
+    finished page turns out to match `params.manifest`.  Uploaders that do
+    not support multipart uploads get every page whole.
+
+    :param fname: S3 key of the page
+    :param chunks: iterable of rendered page fragments
+    :param log: bound logger of the calling page generator
+    :param stage: stage of the calling page generator
+    :param kind: kind of page, a key of `PAGE_CACHE_CONTROL`
+    :param condition: `IfMatch` or `IfNoneMatch` argument the write depends
+        on, as for `_put_body`
+
+    :returns: False if `condition` did not hold, otherwise True
+    """
+    if params.uploader is not None and not params.uploader.multipart:
+        ## Writers to local artifacts take the page whole
+        return _put_page(fname, "".join(chunks), log, stage, kind)
+    client = params.s3.meta.client
+    metadata = _page_metadata(kind)
+    compressor = _compressor()
+    hasher = hashlib.sha256()
+    buffer = bytearray()
+    upload_id = None
+    parts = list()
+    try:
+        for chunk in itertools.chain(chunks, [None]):
+            if chunk is None:
+                ## End of the page: flush whatever the compressor holds back
+                data = compressor.flush() if compressor is not None else b""
+            else:
+                data = chunk.encode("utf-8")
+                if compressor is not None:
+                    data = compressor.compress(data)
+            hasher.update(data)
+            buffer += data
+            if len(buffer) < MULTIPART_PART_SIZE or chunk is None:
+                continue
+            if upload_id is None:
+                upload_id = client.create_multipart_upload(
+                    Bucket=params.WEBSITE_BUCKET, Key=fname, **metadata
+                )["UploadId"]
+            response = client.upload_part(
+                Bucket=params.WEBSITE_BUCKET,
+                Key=fname,
+                UploadId=upload_id,
+                PartNumber=len(parts) + 1,
+                Body=bytes(buffer),
+            )
+            parts.append({"ETag": response["ETag"], "PartNumber": len(parts) + 1})
+            buffer.clear()
+        if upload_id is None:
+            return _put_body(fname, bytes(buffer), log, stage, metadata, condition)
+        digest = PageManifest.digest(hasher=hasher, metadata=metadata)
+        if params.manifest is not None and params.manifest.unchanged(fname, digest):
+            client.abort_multipart_upload(
+                Bucket=params.WEBSITE_BUCKET, Key=fname, UploadId=upload_id
+            )
+            log.debug(stage, reason="Page unchanged", filename=fname)
+            return True
+        if buffer:
+            response = client.upload_part(
+                Bucket=params.WEBSITE_BUCKET,
+                Key=fname,
+                UploadId=upload_id,
+                PartNumber=len(parts) + 1,
+                Body=bytes(buffer),
+            )
+            parts.append({"ETag": response["ETag"], "PartNumber": len(parts) + 1})
+        response = client.complete_multipart_upload(
+            Bucket=params.WEBSITE_BUCKET,
+            Key=fname,
+            UploadId=upload_id,
+            MultipartUpload={"Parts": parts},
+            **(condition or dict()),
+        )
+    except BaseException as e:
+        ## Whatever stopped the page (S3, the template, the Lambda timing
+        ## out), S3 keeps and bills for the parts until the upload is aborted
+        if upload_id is not None:
+            try:
+                client.abort_multipart_upload(
+                    Bucket=params.WEBSITE_BUCKET, Key=fname, UploadId=upload_id
+                )
+            except ClientError as abort_error:
+                log.error(
+                    stage,
+                    reason="Abort failed",
+                    exception=abort_error,
+                    filename=fname,
+                    upload_id=upload_id,
+                )
+        if isinstance(e, ClientError):
+            if condition is not None and e.response["Error"]["Code"] in CONFLICT_CODES:
+                log.debug(stage, reason="Page changed", filename=fname)
+                return False
+            log.error(stage, reason=str(e), exception=e, filename=fname)
+            raise RuntimeError from e
+        raise
+    log.debug(stage, reason="Put page to S3 in parts", parts=len(parts))
+    if params.manifest is not None:
+        params.manifest.record(fname, digest)
+    params.cache_invalidations.append(fname)
+    return True
+
+
+def _page_etag(fname):
+    """Find the ETag of a published page
+
+    :param fname: S3 key of the page
+
+    :returns: string, or None if there is no such page
+    """
+    try:
+        response = params.s3.meta.client.head_object(
+            Bucket=params.WEBSITE_BUCKET, Key=fname
+        )
+    except ClientError as e:
+        if e.response["Error"]["Code"] in ("NoSuchKey", "404", "NotFound"):
+            return None
+        raise RuntimeError from e
+    return response["ETag"]
+
+
+def _put_current_page(fname, etag, render, log, stage, kind):
+    """Upload a page rendered from state that other invocations also update
+
+    The page is written on condition that it has not changed since `etag`
+    was read, which is before the state it is rendered from was read.  If
+    it has changed, another invocation has rendered it from state at least
+    as new, so the ETag and then the state are read again and the page
+    rendered afresh.  A page rendered from stale state therefore never
+    replaces one rendered from newer state.
+
+    :param fname: S3 key of the page
+    :param etag: ETag of the page before the state was read, None if there
+        was no page
+    :param render: callable taking True if the state must be read again,
+        and returning the page as an iterable of text chunks
+    :param log: bound logger of the calling page generator
+    :param stage: stage of the calling page generator
+    :param kind: kind of page, a key of `PAGE_CACHE_CONTROL`
+
+    :returns: None
+    """
+    for attempt in range(UPDATE_ATTEMPTS):
+        if attempt:
+            etag = _page_etag(fname)
+        condition = {"IfNoneMatch": "*"} if etag is None else {"IfMatch": etag}
+        if _put_page_stream(fname, render(attempt > 0), log, stage, kind, condition):
+            return
+        log.debug(stage, reason="Page changed, rendering again", filename=fname)
+    raise RuntimeError(f"{fname} changed on every one of {UPDATE_ATTEMPTS} tries")
+
+
+def _topic_entries(meetings, batch_size=100):
+    """Turn meetings into topic page entries as the template consumes them
+
+    :param meetings: iterable of meeting dictionaries, newest first
+    :param batch_size: number of start times formatted at a time
+
+    :returns: generator of entry dictionaries
+    """
+    meetings = iter(meetings)
+    while batch := list(itertools.islice(meetings, batch_size)):
+        start_times = project_times(
+            [meeting["start_time"] for meeting in batch], do_round=True, pretty=True
+        )
+        for meeting, start_time in zip(batch, start_times):
+            yield {
+                "start_time": start_time,
+                "recording_path": f"/{meeting['recording_path']}/",
+            }
 
 
 def create_meeting_page(meeting_document):
@@ -23,129 +430,594 @@ def create_meeting_page(meeting_document):
     meeting_document["end_time"] = project_time(
         meeting_document["end_time"], pretty=True
     )
-    params.log.info(
+    params.log.debug(
         stage, reason="Render input", render_input=meeting_document, fname=fname
     )
 
-    meeting_page = params.j2_env.get_template("meeting.j2.html").render(
-        **meeting_document
-    )
-    try:
-        response = params.s3.Bucket(params.WEBSITE_BUCKET).put_object(
-            Key=fname,
-            Body=meeting_page,
-            ContentType="text/html",
-        )
-    except ClientError as e:
-        params.log.error(stage, reason=str(e), exception=e, fname=fname)
-        raise RuntimeError from e
-    params.log.debug(stage, reason="Put page to S3", response=response)
-    params.cache_invalidations.append(fname)
+    meeting_page = get_template("meeting.j2.html").render(**meeting_document)
+    _put_page(fname, meeting_page, params.log, stage, "meeting")
     return
 
 
-def create_topic_page(org, topic):
-    """Create HTML page in S3 for all meeting in a topic
+def _current_year():
+    return project_year(datetime.utcnow().strftime("%Y-%m-%dT%H:%M:%SZ"))
 
-    :param org: organization hosting the meeting
-    :parameter topic: meeting topic
 
-    :returns: None
-    """
-    ##STAGE Create topic page
-    stage = "Create topic page"
-    log = params.log.bind(topic=topic)
+def _query_topic(topic, **query_kwargs):
+    """Stream a topic's meetings from the `meeting-index`, newest first
 
-    response = params.meetings_table.scan(
+    :param topic: meeting topic
+    :param query_kwargs: extra arguments for Table.query()
+
+    :returns: generator of meeting dictionaries
+    """
+    ## The index is sorted on start_time, so it streams newest first
+    key_condition = Key("meeting_topic").eq(topic)
+    if (bounds := query_kwargs.pop("between", None)) is not None:
+        key_condition = key_condition & Key("start_time").between(*bounds)
+    return query_table(
         IndexName="meeting-index",
         Select="ALL_PROJECTED_ATTRIBUTES",
-        FilterExpression=Key("meeting_topic").eq(topic),
+        KeyConditionExpression=key_condition,
+        ScanIndexForward=False,
+        **query_kwargs,
     )
-    log.debug(stage, reason="Retrieved results", response=response)
-    if (meetings := response.get("Items")) is None:
-        log.error(stage, reason="NONE FOUND", topic=topic, get_item_response=response)
-        return
 
+
+def _latest_meetings(topic):
+    """Read a topic's newest `LATEST_MEETINGS` meetings
+
+    `query_table` follows `LastEvaluatedKey`, so the stream is cut off after
+    the first page instead of letting it read the rest of the topic.
+
+    :param topic: meeting topic
+
+    :returns: list of meeting dictionaries, newest first
+    """
+    return list(
+        itertools.islice(
+            _query_topic(topic, Limit=LATEST_MEETINGS),
+            LATEST_MEETINGS,
+        )
+    )
+
+
+def _topic_years(topic, newest):
+    """Find the years in which a topic has meetings, without reading them all
+
+    :param topic: meeting topic
+    :param newest: the topic's newest meeting
+
+    :returns: list of year strings, newest first
+    """
+    oldest = next(
+        query_table(
+            IndexName="meeting-index",
+            Select="ALL_PROJECTED_ATTRIBUTES",
+            KeyConditionExpression=Key("meeting_topic").eq(topic),
+            ScanIndexForward=True,
+            Limit=1,
+        ),
+        newest,
+    )
+    first, last = int(project_year(oldest["start_time"])), int(
+        project_year(newest["start_time"])
+    )
+    years = list()
+    for year in range(last, first - 1, -1):
+        ## Years in between may be empty; probe each with a one-item query
+        if year in (first, last) or any(
+            _query_topic(topic, between=year_bounds(year), Limit=1)
+        ):
+            years.append(str(year))
+    return years
+
+
+def _merge_meetings(meetings, new_meetings):
+    """Add meetings to a list, replacing any with the same recording path
+
+    :param meetings: iterable of meeting dictionaries
+    :param new_meetings: iterable of meeting dictionaries to add
+
+    :returns: list of meeting dictionaries, newest first
+    """
+    merged = {meeting["recording_path"]: meeting for meeting in meetings}
+    merged.update((meeting["recording_path"], meeting) for meeting in new_meetings)
+    return sorted(merged.values(), key=lambda i: i["start_time"], reverse=True)
+
+
+def _topic_page_key(org, topic, year=None):
+    """Find the S3 key of a topic's landing page or of one of its archives
+
+    :param org: organization hosting the meeting
+    :param topic: meeting topic
+    :param year: year of the archive page, None for the landing page
+
+    :returns: string
+    """
+    topic_path = recording_path(organization=org, meeting_topic=topic)
+    return f"{topic_path}/{year}.html" if year else f"{topic_path}/index.html"
+
+
+def _topic_landing_page(org, topic, latest, years):
+    """Render a topic's landing page
+
+    :param org: organization hosting the meeting
+    :param topic: meeting topic
+    :param latest: the topic's newest meetings, newest first
+    :param years: years with meetings, newest first
+
+    :returns: generator of page fragments
+    """
     render_input = {
         "organization": org,
         "meeting_topic": topic,
-        "meetings": [],
+        "meetings": _topic_entries(latest),
+        "archives": [
+            {"period": year, "path": f"/{_topic_page_key(org, topic, year)}"}
+            for year in years
+        ],
     }
-    for meeting in reversed(sorted(meetings, key=lambda i: i["start_time"])):
-        entry = {
-            "start_time": project_time(
-                meeting["start_time"], do_round=True, pretty=True
-            ),
-            "recording_path": f"/{meeting['recording_path']}/",
+    return get_template("topic.j2.html").generate(**render_input)
+
+
+def _topic_archive_page(org, topic, year, meetings):
+    """Render a topic's archive page for a year
+
+    :param org: organization hosting the meeting
+    :param topic: meeting topic
+    :param year: year of the archive
+    :param meetings: the year's meetings, newest first
+
+    :returns: generator of page fragments
+    """
+    render_input = {
+        "organization": org,
+        "meeting_topic": topic,
+        "period": year,
+        "meetings": _topic_entries(meetings),
+        "landing_path": f"/{recording_path(organization=org, meeting_topic=topic)}/",
+    }
+    return get_template("topic.j2.html").generate(**render_input)
+
+
+def _archive_kind(year):
+    ## The current year's archive still grows; older ones are final
+    return "topic" if year >= _current_year() else "archive"
+
+
+def _render_topic_pages(org, topic, latest, years, archives):
+    """Render and upload a topic's landing page and archive pages
+
+    :param org: organization hosting the meeting
+    :param topic: meeting topic
+    :param latest: the topic's newest meetings, newest first
+    :param years: years with meetings, newest first
+    :param archives: iterable of (year, meetings newest first) for the
+        archive pages to render
+
+    :returns: None
+    """
+    ##STAGE Create topic page
+    stage = "Create topic page"
+    log = params.log.bind(topic=topic)
+
+    fname = _topic_page_key(org, topic)
+    log.info(stage, reason="Render input", organization=org, fname=fname)
+    topic_page = _topic_landing_page(org, topic, latest, years)
+    _put_page_stream(fname, topic_page, log, stage, "topic")
+
+    for year, meetings in archives:
+        fname = _topic_page_key(org, topic, year)
+        log.debug(stage, reason="Render archive", fname=fname)
+        topic_page = _topic_archive_page(org, topic, year, meetings)
+        _put_page_stream(fname, topic_page, log, stage, _archive_kind(year))
+
+
+def create_topic_page(org, topic, meetings=None, archive_years=None):
+    """Create HTML pages in S3 for all meetings in a topic
+
+    The topic's landing page lists its newest `LATEST_MEETINGS` meetings and
+    links to an archive page for each year (US/Eastern) with meetings.  A new
+    recording changes only the landing page and the archive for its year.
+    What the pages were rendered from is saved to `params.topic_listings`
+    for `update_topic_page`.
+
+    :param org: organization hosting the meeting
+    :parameter topic: meeting topic
+    :param meetings: list of meeting dictionaries with `start_time` and
+        `recording_path`; streamed from the `meeting-index` when not supplied
+    :param archive_years: years whose archive pages are rendered when
+        `meetings` is not supplied (default: every year)
+
+    :returns: None
+    """
+    ##STAGE Create topic page
+    stage = "Create topic page"
+
+    if meetings is not None:
+        meetings_by_year = dict()
+        for meeting in reversed(sorted(meetings, key=lambda i: i["start_time"])):
+            year = project_year(meeting["start_time"])
+            meetings_by_year.setdefault(year, list()).append(meeting)
+        years = list(meetings_by_year)
+        latest = list(
+            itertools.islice(
+                itertools.chain.from_iterable(meetings_by_year.values()),
+                LATEST_MEETINGS,
+            )
+        )
+        archive_years = years
+        year_meetings = meetings_by_year.get
+    else:
+        latest = _latest_meetings(topic)
+        years = _topic_years(topic, latest[0]) if latest else list()
+        if archive_years is None:
+            archive_years = years
+        ## The newest year is kept for the listing, so it is read only once
+        newest = {
+            year: list(_query_topic(topic, between=year_bounds(year)))
+            for year in years[:1]
         }
-        render_input["meetings"].append(entry)
-    fname = f"{recording_path(organization=org, meeting_topic=topic)}/index.html"
-    log.info(stage, reason="Render input", render_input=render_input, fname=fname)
 
-    topic_page = params.j2_env.get_template("topic.j2.html").render(**render_input)
-    try:
-        response = params.s3.Bucket(params.WEBSITE_BUCKET).put_object(
-            Key=fname,
-            Body=topic_page,
-            ContentType="text/html",
+        def year_meetings(year):
+            return newest.get(year) or _query_topic(topic, between=year_bounds(year))
+
+    if not latest:
+        params.log.error(stage, reason="NONE FOUND", topic=topic)
+        return
+
+    _render_topic_pages(
+        org,
+        topic,
+        latest,
+        years,
+        ((year, year_meetings(year)) for year in archive_years),
+    )
+    params.topic_listings.save(org, topic, latest, years, year_meetings(years[0]))
+    return
+
+
+def update_topic_page(org, topic, new_meetings):
+    """Re-create a topic's pages for new recordings from its listing
+
+    The recordings are merged into the topic's listing in
+    `params.topic_listings`, which holds everything the landing page and
+    the newest year's archive are rendered from.  The merge is a conditional
+    update, so recordings merged by concurrent invocations are kept.  The
+    pages are written with `_put_current_page`, so a page rendered from an
+    older listing never replaces one rendered from a newer listing.  A
+    recording from an older year has that year's archive queried, and a
+    topic without a listing is queried once to start one; in both cases the
+    new recordings are merged into what the table's index returns, as it
+    may not have caught up.
+
+    :param org: organization hosting the meeting
+    :param topic: meeting topic
+    :param new_meetings: list of meeting dictionaries with `start_time` and
+        `recording_path`
+
+    :returns: None
+    """
+    ##STAGE Create topic page
+    stage = "Create topic page"
+    log = params.log.bind(topic=topic)
+    new_by_year = dict()
+    for meeting in new_meetings:
+        new_by_year.setdefault(project_year(meeting["start_time"]), list()).append(
+            meeting
         )
-    except ClientError as e:
-        log.error(stage, reason=str(e), exception=e, filename=fname)
-        raise RuntimeError from e
-    log.debug(stage, reason="Put page to S3", response=response)
-    params.cache_invalidations.append(fname)
+
+    def merge(listing):
+        if listing is None:
+            log.debug(stage, reason="No topic listing")
+            latest = _latest_meetings(topic)
+            years = _topic_years(topic, latest[0]) if latest else list()
+            listing = {
+                "latest": latest,
+                "years": years,
+                "year": years[0] if years else None,
+                "meetings": list(_query_topic(topic, between=year_bounds(years[0])))
+                if years
+                else list(),
+            }
+        latest = _merge_meetings(listing["latest"], new_meetings)[:LATEST_MEETINGS]
+        years = sorted(set(listing["years"]).union(new_by_year), reverse=True)
+        year_meetings = listing["meetings"] if years[0] == listing["year"] else list()
+        return (
+            latest,
+            years,
+            _merge_meetings(year_meetings, new_by_year.get(years[0], list())),
+        )
+
+    ## The pages' ETags are read before the listing, see `_put_current_page`
+    pages = [(None, _topic_page_key(org, topic))] + [
+        (year, _topic_page_key(org, topic, year)) for year in sorted(new_by_year)
+    ]
+    etags = [_page_etag(fname) for year, fname in pages]
+    written = params.topic_listings.update(org, topic, merge)
+
+    def current_listing(reload):
+        return params.topic_listings.load(org, topic) if reload else written
+
+    def render_landing(reload):
+        listing = current_listing(reload)
+        return _topic_landing_page(org, topic, listing["latest"], listing["years"])
+
+    def render_archive(year, reload):
+        listing = current_listing(reload)
+        if year == listing["year"]:
+            meetings = listing["meetings"]
+        else:
+            meetings = _merge_meetings(
+                _query_topic(topic, between=year_bounds(year)), new_by_year[year]
+            )
+        return _topic_archive_page(org, topic, year, meetings)
+
+    for (year, fname), etag in zip(pages, etags):
+        if year is None:
+            log.info(stage, reason="Render input", organization=org, fname=fname)
+            _put_current_page(fname, etag, render_landing, log, stage, "topic")
+        else:
+            log.debug(stage, reason="Render archive", fname=fname)
+            _put_current_page(
+                fname,
+                etag,
+                functools.partial(render_archive, year),
+                log,
+                stage,
+                _archive_kind(year),
+            )
     return
 
 
-def create_organization_page(org):
-    """Create HTML page in S3 for all topics in an organization
+def _query_organization_topics(org):
+    """Find an organization's meeting topics in the `organization-index`
 
     :param org: organization
 
-    :returns: None
+    :returns: set of meeting topics
     """
-    ##STAGE Create organization page
-    stage = "Create organization page"
-    log = params.log.bind(organization=org)
+    return {
+        item["meeting_topic"]
+        for item in query_table(
+            IndexName="organization-index",
+            ProjectionExpression="meeting_topic",
+            KeyConditionExpression=Key("organization").eq(org),
+        )
+    }
 
-    response = params.meetings_table.scan(
-        IndexName="organization-index",
-        Select="ALL_PROJECTED_ATTRIBUTES",
-        FilterExpression=Key("organization").eq(org),
-    )
-    log.debug(stage, reason="Retrieved results", response=response)
-    if (topics := response.get("Items")) is None:
-        log.error(stage, reason="NONE FOUND", org=org, get_item_response=response)
-        return
 
-    topics = list({v["meeting_topic"]: v for v in topics})
-    topics.sort()
+def _organization_page(org, topics):
+    """Render an organization page
+
+    :param org: organization
+    :param topics: iterable of meeting topics
 
+    :returns: tuple of (S3 key, page)
+    """
+    ##STAGE Create organization page
+    stage = "Create organization page"
+    topics = sorted(topics)
     render_input = {
         "organization": org,
         "topics": [],
     }
-    for topic in topics:
+    topic_paths = recording_paths(
+        [{"organization": org, "meeting_topic": topic} for topic in topics]
+    )
+    for topic, topic_path in zip(topics, topic_paths):
         entry = {
             "meeting_topic": topic,
-            "meeting_topic_path": f"/{recording_path(organization=org, meeting_topic=topic)}/",
+            "meeting_topic_path": f"/{topic_path}/",
         }
         render_input["topics"].append(entry)
     fname = f"{recording_path(organization=org)}/index.html"
-    log.info(stage, reason="Render input", render_input=render_input, fname=fname)
+    params.log.debug(
+        stage, reason="Render input", render_input=render_input, fname=fname
+    )
+    return fname, get_template("organization.j2.html").render(**render_input)
+
+
+def create_organization_page(org, topics=None):
+    """Create HTML page in S3 for all topics in an organization
+
+    The topics are also saved to `params.organization_topics` for
+    `update_organization_page`.
+
+    :param org: organization
+    :param topics: iterable of meeting topics; queried from the
+        `organization-index` when not supplied
+
+    :returns: None
+    """
+    ##STAGE Create organization page
+    stage = "Create organization page"
+    log = params.log.bind(organization=org)
+
+    if topics is None:
+        topics = _query_organization_topics(org)
+        log.debug(stage, reason="Retrieved results", count=len(topics))
+    if not topics:
+        log.error(stage, reason="NONE FOUND", org=org)
+        return
+
+    params.organization_topics.save(org, topics)
+    fname, page = _organization_page(org, topics)
+    _put_page(fname, page, log, stage, "organization")
+    return
 
-    topic_page = params.j2_env.get_template("organization.j2.html").render(
-        **render_input
+
+def update_organization_page(org, topics):
+    """Re-create an organization page only if it lacks one of the topics
+
+    New topics are rare, so usually this costs one read of the organization's
+    topic summary.  When there is a new topic, the topic list is queried
+    again and, with the new topics (which the index may not have caught up
+    with), added to the summary.  The addition is a conditional update, so
+    topics that concurrent invocations add are kept, and the page is
+    rendered from the summary as written, with `_put_current_page`.
+
+    :param org: organization
+    :param topics: iterable of meeting topics that have new recordings
+
+    :returns: True if the page was re-created
+    """
+    ##STAGE Create organization page
+    stage = "Create organization page"
+    log = params.log.bind(organization=org)
+    known = params.organization_topics.load(org)
+    if known is not None and known.issuperset(topics):
+        log.debug(stage, reason="Topic list unchanged")
+        return False
+    fname = f"{recording_path(organization=org)}/index.html"
+    etag = _page_etag(fname)
+    written = params.organization_topics.add(
+        org, _query_organization_topics(org).union(topics)
     )
-    try:
-        response = params.s3.Bucket(params.WEBSITE_BUCKET).put_object(
-            Key=fname,
-            Body=topic_page,
-            ContentType="text/html",
+
+    def render(reload):
+        return [
+            _organization_page(
+                org, params.organization_topics.load(org) if reload else written
+            )[1]
+        ]
+
+    _put_current_page(fname, etag, render, log, stage, "organization")
+    return True
+
+
+def _search_shard(org, year, recordings, published=None):
+    """Render a year's search shard
+
+    :param org: organization
+    :param year: year of the shard
+    :param recordings: dictionary of recording page path -> (meeting topic,
+        start time)
+    :param published: the published shard (bytes) to merge the recordings
+        into, or None
+
+    :returns: string, JSON document
+    """
+    recordings = dict(recordings)
+    if published is not None:
+        published = json.loads(published)
+        for topic_index, start_time, path in published["recordings"]:
+            recordings.setdefault(path, (published["topics"][topic_index], start_time))
+    ## Topic names repeat across a year, so entries refer to them by index
+    shard_topics = sorted({topic for topic, _ in recordings.values()})
+    topic_indexes = {topic: i for i, topic in enumerate(shard_topics)}
+    shard = {
+        "organization": org,
+        "year": year,
+        "topics": shard_topics,
+        "recordings": sorted(
+            (
+                [topic_indexes[topic], start_time, path]
+                for path, (topic, start_time) in recordings.items()
+            ),
+            key=lambda recording: recording[1],
+            reverse=True,
+        ),
+    }
+    return json.dumps(shard, separators=(",", ":"))
+
+
+def _search_catalog(org, years, published=None):
+    """Render the list of an organization's search shards
+
+    :param org: organization
+    :param years: iterable of years with recordings
+    :param published: the published catalog (bytes) to merge the years
+        into, or None
+
+    :returns: string, JSON document
+    """
+    years = set(years)
+    if published is not None:
+        years.update(json.loads(published)["years"])
+    catalog = {"organization": org, "years": sorted(years, reverse=True)}
+    return json.dumps(catalog, separators=(",", ":"))
+
+
+def create_search_index(org, topics, replace=False):
+    """Publish the search index of an organization's recordings
+
+    The index is a set of JSON files that a browser can filter without
+    crawling the topic pages: `{org}/search/{year}.json` lists the topic,
+    start time (US/Eastern) and page path of each recording of a year, and
+    `{org}/search/index.json` lists the years.  Unless `replace` is set, the
+    recordings are merged into the published files with `_merge_page`,
+    which costs one read per year touched, does not depend on the table's
+    indexes having caught up, and keeps what concurrent invocations merge.
+
+    :param org: organization
+    :param topics: dictionary of meeting topic -> meeting dictionaries with
+        `start_time` and `recording_path`
+    :param replace: True if `topics` holds every recording of the organization
+
+    :returns: None
+    """
+    ##STAGE Create search index
+    stage = "Create search index"
+    log = params.log.bind(organization=org)
+    search_path = f"{recording_path(organization=org)}/search"
+
+    ## year -> recording page path -> (meeting topic, start time)
+    shards = dict()
+    for topic, meetings in topics.items():
+        for meeting in meetings:
+            shards.setdefault(project_year(meeting["start_time"]), dict())[
+                f"/{meeting['recording_path']}/"
+            ] = (topic, project_time(meeting["start_time"]))
+
+    current_year = _current_year()
+    for year, recordings in shards.items():
+        fname = f"{search_path}/{year}.json"
+        log.debug(stage, reason="Search shard", fname=fname, count=len(recordings))
+        kind = "search" if year >= current_year else "archive"
+        if replace:
+            shard = _search_shard(org, year, recordings)
+            _put_page(fname, shard, log, stage, kind, content_type="application/json")
+        else:
+            _merge_page(
+                fname,
+                functools.partial(_search_shard, org, year, recordings),
+                log,
+                stage,
+                kind,
+                content_type="application/json",
+            )
+
+    fname = f"{search_path}/index.json"
+    if replace:
+        catalog = _search_catalog(org, shards)
+        _put_page(fname, catalog, log, stage, "search", content_type="application/json")
+    else:
+        _merge_page(
+            fname,
+            functools.partial(_search_catalog, org, list(shards)),
+            log,
+            stage,
+            "search",
+            content_type="application/json",
         )
-    except ClientError as e:
-        log.error(stage, reason=str(e), exception=e, filename=fname)
-        raise RuntimeError from e
-    log.debug(stage, reason="Put page to S3", response=response)
-    params.cache_invalidations.append(fname)
+    return
+
+
+def sync_static_pages():
+    """Publish the pages that are not generated, such as the login page
+
+    The pages go through the same content check as generated pages, so a
+    page is uploaded and invalidated only when it has changed.
+
+    :returns: None
+    """
+    ##STAGE Sync static pages
+    stage = "Sync static pages"
+    for source, fname in STATIC_PAGES:
+        with open(os.path.join(TASK_ROOT, source), "rb") as fp:
+            page = fp.read()
+        params.log.debug(stage, reason="Static page", source=source, fname=fname)
+        _put_page(fname, page, params.log, stage, "static")
     return
@@ -0,0 +1,101 @@
+"""
+Coalesce CloudFront invalidations across Lambda invocations
+"""
+import time
+
+from .. import params
+from .aws_helpers import collapse_paths, invalidate_cache
+
+
+class InvalidationBatcher:
+    """
+    Pending invalidation paths, kept in a state store until they are sent to
+    CloudFront as one batch.  Each invocation defers its paths to a document
+    of its own, so concurrent invocations never overwrite each other's paths.
+    A flush merges every pending document and sends at most one invalidation
+    per `window` seconds, unless the pending paths exceed `path_budget`.
+
+    :param store: state store holding the pending paths
+    :param window: least number of seconds between two invalidations
+    :param path_budget: number of distinct pending paths that forces a flush
+        before the window is up
+    :param clock: callable returning the current time in seconds
+        (default: :func:`time.time`)
+    """
+
+    PENDING_PREFIX = "pending-invalidations/"
+    LAST_FLUSH = "invalidation-last-flush.json"
+
+    def __init__(self, store, window=300, path_budget=1000, clock=time.time):
+        self._store = store
+        self.window = window
+        self.path_budget = path_budget
+        self._clock = clock
+
+    def defer(self, id, paths):
+        """Add paths to the pending set
+
+        :param id: identifier of the deferring invocation
+        :param paths: S3 keys of the changed pages
+
+        :returns: number of distinct paths deferred
+        """
+        paths = sorted(set(paths))
+        if paths:
+            self._store.save(
+                f"{self.PENDING_PREFIX}{id}.json",
+                {"paths": paths, "time": self._clock()},
+            )
+        return len(paths)
+
+    def flush(self, id, force=False):
+        """Send the pending paths to CloudFront if the batch is due
+
+        :param id: identifier for the invalidation
+        :param force: send the pending paths even if the window is not up
+
+        :returns: boto3.client.create_invalidation() response, or None if
+            nothing was sent
+        """
+        ##STAGE Flush pending invalidations
+        stage = "Flush pending invalidations"
+        names = self._store.names(self.PENDING_PREFIX)
+        documents = dict()
+        for name in names:
+            ## A concurrent flush may have sent and removed it already
+            if (document := self._store.load(name)) is not None:
+                documents[name] = document
+        if not documents:
+            return None
+
+        received = sum(len(document["paths"]) for document in documents.values())
+        paths = set().union(*(document["paths"] for document in documents.values()))
+        now = self._clock()
+        last_flush = self._store.load(self.LAST_FLUSH, dict()).get("time", 0)
+        if not (
+            force or now - last_flush >= self.window or len(paths) >= self.path_budget
+        ):
+            params.log.info(
+                stage,
+                reason="Invalidation deferred",
+                pending_batches=len(documents),
+                pending_paths=len(paths),
+                seconds_until_flush=round(self.window - (now - last_flush)),
+            )
+            return None
+
+        self._store.save(self.LAST_FLUSH, {"time": now, "id": id})
+        response = invalidate_cache(id, paths)
+        for name in documents:
+            self._store.delete(name)
+        oldest = min(document["time"] for document in documents.values())
+        params.log.info(
+            stage,
+            reason="Invalidation sent",
+            batches_coalesced=len(documents),
+            paths_received=received,
+            paths_distinct=len(paths),
+            paths_sent=len(collapse_paths("/" + path for path in paths)),
+            oldest_pending_seconds=round(now - oldest, 1),
+        )
+        return response
@@ -7,6 +7,7 @@ https://github.com/jkpl/eks-auth-sync/blob/84ef8f0030881497cfbc5c0698a579508d5ed
 """
 import json
 import logging
+import os
 import sys
 from typing import List
 
@@ -14,6 +15,11 @@ import structlog
 from structlog.processors import _json_fallback_handler
 from structlog.types import Any, Callable, EventDict, Union
 
+try:
+    import orjson
+except ImportError:  # Fall back to the standard library's `json.dumps`
+    orjson = None
+
 _NOISY_LOG_SOURCES = (
     "boto",
     "boto3",
@@ -72,11 +78,82 @@ class AWSCloudWatchLogs:
             callout_two = event_dict.get(self._callout_two_key, "")
         else:
             callout_two = "none"
-        return f'[{name.upper()}] "{callout_one}" "{callout_two}" ' + self._dumps(
-            event_dict, **self._dumps_kw
-        )
+        rendered = self._dumps(event_dict, **self._dumps_kw)
+        if isinstance(rendered, bytes):
+            rendered = rendered.decode("utf-8")
+        return f'[{name.upper()}] "{callout_one}" "{callout_two}" ' + rendered
+
+
+class TruncateLargeFields:
+    """
+    Shorten the large values in a log line before it is serialized, so a
+    log call costs about the same whatever it is handed.  Long strings are
+    cut, and long lists and dictionaries keep only their first items with a
+    note of how many were left out.  Nesting deeper than `max_depth` is
+    replaced by its `repr`, cut to `max_string` characters.
+
+    :param max_string: longest string kept whole
+    :param max_items: most list items or dictionary keys kept
+    :param max_depth: deepest nesting kept
+    :param keep: keys of the log line never shortened; `exception` holds
+        the traceback `format_exc_info` renders, which is kept whole
+    """
+
+    def __init__(
+        self,
+        max_string: int = 1024,
+        max_items: int = 50,
+        max_depth: int = 4,
+        keep: tuple = ("event", "reason", "timestamp", "exception"),
+    ) -> None:
+        self.max_string = max_string
+        self.max_items = max_items
+        self.max_depth = max_depth
+        self._keep = frozenset(keep)
+
+    def _shorten(self, value: Any, depth: int) -> Any:
+        if isinstance(value, str):
+            if len(value) > self.max_string:
+                return f"{value[:self.max_string]}... ({len(value)} characters)"
+            return value
+        if isinstance(value, (dict, list, tuple, set)):
+            if depth >= self.max_depth:
+                return self._shorten(repr(value), depth)
+            if isinstance(value, dict):
+                shortened = {
+                    key: self._shorten(item, depth + 1)
+                    for key, item in list(value.items())[: self.max_items]
+                }
+                if len(value) > self.max_items:
+                    shortened["..."] = f"{len(value) - self.max_items} more keys"
+                return shortened
+            shortened = [
+                self._shorten(item, depth + 1) for item in list(value)[: self.max_items]
+            ]
+            if len(value) > self.max_items:
+                shortened.append(f"... {len(value) - self.max_items} more items")
+            return shortened
+        return value
+
+    def __call__(self, _, name: str, event_dict: EventDict) -> EventDict:
+        for key, value in event_dict.items():
+            if key not in self._keep:
+                event_dict[key] = self._shorten(value, 0)
+        return event_dict
 
 
+def _serializer():
+    """Pick the fastest JSON serializer installed
+
+    :returns: tuple of (serializer, keyword arguments for the serializer)
+    """
+    if orjson is not None:
+        return orjson.dumps, {"option": orjson.OPT_NON_STR_KEYS}
+    return json.dumps, dict()
+
+
+_serialize, _serialize_kw = _serializer()
+
 _PROCESSORS = (
     structlog.stdlib.filter_by_level,
     structlog.stdlib.add_logger_name,
@@ -87,20 +164,53 @@ _PROCESSORS = (
     structlog.processors.format_exc_info,
     structlog.processors.UnicodeDecoder(),
     structlog.threadlocal.merge_threadlocal,
-    AWSCloudWatchLogs(callouts=["event", "reason"]),
+    TruncateLargeFields(
+        max_string=int(os.environ.get("LOG_MAX_STRING", 1024)),
+        max_items=int(os.environ.get("LOG_MAX_ITEMS", 50)),
+    ),
+    AWSCloudWatchLogs(
+        callouts=["event", "reason"], serializer=_serialize, **_serialize_kw
+    ),
 )
 
+_configured = False
+
+
+def _log_level(name):
+    """Look up a logging level by name
+
+    :param name: level name, such as `INFO` or `debug`
+
+    :returns: tuple of (level number, whether the name was valid); INFO for
+        a name that is not a level
+    """
+    level = logging.getLevelName(name.upper())
+    if isinstance(level, int):
+        return level, True
+    return logging.INFO, False
+
 
 def setup_logging():
     """
-    Configure logging for the application.
+    Configure logging for the application.  Lambda reuses the process for
+    later invocations, so only the first call in a container does any work.
+
+    The level comes from the `LOG_LEVEL` environment variable (default=INFO,
+    also used with a warning if `LOG_LEVEL` is not a level name).  Log calls
+    below that level return before their arguments are processed or
+    serialized.
     """
+    global _configured
+    if _configured:
+        return
+    level_name = os.environ.get("LOG_LEVEL", "INFO")
+    level, valid_level = _log_level(level_name)
 
     # Structlog configuration
     structlog.configure(
         processors=list(_PROCESSORS),
         context_class=dict,
-        wrapper_class=structlog.stdlib.BoundLogger,
+        wrapper_class=structlog.make_filtering_bound_logger(level),
         logger_factory=structlog.stdlib.LoggerFactory(),
         cache_logger_on_first_use=True,
     )
@@ -110,8 +220,17 @@ def setup_logging():
     logging.basicConfig(
         format="%(message)s",
         stream=sys.stdout,
-        level=logging.DEBUG,
+        level=level,
         force=True,
     )
     for source in _NOISY_LOG_SOURCES:
-        logging.getLogger(source).setLevel(logging.WARNING)
+        logging.getLogger(source).setLevel(max(level, logging.WARNING))
+    ## The handlers' metric summaries are written whatever the level
+    logging.getLogger("serverless_recordings_site.util.metrics").setLevel(logging.INFO)
+    _configured = True
+    if not valid_level:
+        structlog.get_logger(__name__).warning(
+            "Setup logging",
+            reason="Unknown LOG_LEVEL, using INFO",
+            log_level=level_name,
+        )
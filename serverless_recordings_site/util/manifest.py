@@ -0,0 +1,103 @@
+"""
+Track the content of the pages in the website bucket so unchanged pages are
+neither uploaded nor invalidated
+"""
+import hashlib
+import json
+
+
+class PageManifest:
+    """
+    Content hashes of the pages last uploaded to the website bucket, kept in
+    a state store as one document per top-level directory of the site (in
+    effect, per organization), so that a batch of new recordings reads and
+    writes only the documents of its organizations.  A document is read the
+    first time one of its pages is checked, and written back, merged with
+    any concurrent changes, by `save()`.
+
+    :param store: state store holding the manifest documents
+    """
+
+    PREFIX = "page-manifest/"
+
+    def __init__(self, store):
+        self._store = store
+        ## document name -> page key -> digest
+        self._hashes = dict()
+        self._updates = dict()
+        self.skipped = 0
+
+    @classmethod
+    def _name(cls, key):
+        directory, _, rest = key.partition("/")
+        ## Pages at the root of the site, such as the login page
+        return f"{cls.PREFIX}{directory if rest else '_root'}.json"
+
+    @staticmethod
+    def digest(body=b"", hasher=None, metadata=None):
+        """Hash page content
+
+        The object metadata is part of the hash, so a page whose headers
+        change (a new `Cache-Control`, say) is uploaded again even when its
+        content is the same.
+
+        :param body: bytes, rendered page
+        :param hasher: `hashlib.sha256` object already fed the page, for pages
+            that were hashed as they streamed past
+        :param metadata: dictionary of put_object arguments the page is
+            uploaded with
+
+        :returns: string, hex digest
+        """
+        hasher = hashlib.sha256(body) if hasher is None else hasher.copy()
+        if metadata:
+            hasher.update(json.dumps(metadata, sort_keys=True).encode("utf-8"))
+        return hasher.hexdigest()[:32]
+
+    def unchanged(self, key, digest):
+        """Check whether a page matches what was last uploaded
+
+        :param key: S3 key of the page
+        :param digest: digest of the rendered page
+
+        :returns: boolean
+        """
+        name = self._name(key)
+        if name not in self._hashes:
+            self._hashes[name] = self._store.load(name, dict())
+        if self._updates.get(key, self._hashes[name].get(key)) == digest:
+            self.skipped += 1
+            return True
+        return False
+
+    def record(self, key, digest):
+        """Note that a page was uploaded
+
+        :param key: S3 key of the page
+        :param digest: digest of the uploaded page
+
+        :returns: None
+        """
+        self._updates[key] = digest
+
+    def save(self):
+        """Write recorded uploads back to the state store
+
+        Each document is updated with a conditional write, so uploads that
+        concurrent invocations record in the same document are all kept.
+
+        :returns: number of pages updated in the manifest
+        """
+        if not (updates := dict(self._updates)):
+            return 0
+        by_name = dict()
+        for key, digest in updates.items():
+            by_name.setdefault(self._name(key), dict())[key] = digest
+        for name, name_updates in by_name.items():
+            self._hashes[name] = self._store.update(
+                name,
+                lambda hashes, updates=name_updates: {**hashes, **updates},
+                default=dict(),
+            )
+        self._updates = dict()
+        return len(updates)
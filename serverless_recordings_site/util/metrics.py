@@ -0,0 +1,211 @@
+"""
+Time the stages of a handler and count the AWS calls made in each, reported
+once per invocation in CloudWatch Embedded Metric Format (EMF)
+
+https://docs.aws.amazon.com/AmazonCloudWatch/latest/monitoring/CloudWatch_Embedded_Metric_Format_Specification.html
+"""
+import functools
+import json
+import logging
+import threading
+import time
+
+from .. import params
+
+## DynamoDB operations that report consumed capacity when asked to
+_CAPACITY_OPERATIONS = frozenset(
+    (
+        "BatchGetItem",
+        "BatchWriteItem",
+        "DeleteItem",
+        "GetItem",
+        "PutItem",
+        "Query",
+        "Scan",
+        "TransactGetItems",
+        "TransactWriteItems",
+        "UpdateItem",
+    )
+)
+## S3 operations whose request body is written to the bucket
+_WRITE_OPERATIONS = frozenset(("PutObject", "UploadPart"))
+
+_emf_log = logging.getLogger(__name__)
+
+_COUNTERS = (
+    ("AWSCalls", "Count"),
+    ("AWSErrors", "Count"),
+    ("AWSRetries", "Count"),
+    ("DynamoDBCapacityUnits", "Count"),
+    ("S3BytesWritten", "Bytes"),
+)
+
+
+class StageMetrics:
+    """
+    Elapsed time and AWS call counters for each stage of one invocation.
+
+    Handlers call `enter()` as they move from one stage to the next; each
+    stage lasts until the next one is entered or the summary is emitted.
+    Clients passed to `instrument()` attribute their calls to whichever stage
+    is current, including calls made from worker threads.
+
+    :param namespace: CloudWatch metric namespace
+    :param clock: callable returning the current time in seconds
+        (default: :func:`time.perf_counter`)
+    """
+
+    def __init__(self, namespace="RecordingsSite", clock=time.perf_counter):
+        self.namespace = namespace
+        self._clock = clock
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        """Forget the stages of the previous invocation
+
+        :returns: None
+        """
+        with self._lock:
+            self._started = self._clock()
+            self._stage = "Start"
+            self._stage_started = self._started
+            self._stages = {self._stage: self._new_stage()}
+
+    @staticmethod
+    def _new_stage():
+        return dict(Duration=0.0, **{name: 0 for name, _ in _COUNTERS})
+
+    def enter(self, stage):
+        """End the current stage and start timing the next one
+
+        :param stage: name of the stage being entered
+
+        :returns: None
+        """
+        with self._lock:
+            now = self._clock()
+            self._stages[self._stage]["Duration"] += now - self._stage_started
+            self._stage, self._stage_started = stage, now
+            self._stages.setdefault(stage, self._new_stage())
+
+    def _count(self, **counts):
+        with self._lock:
+            current = self._stages[self._stage]
+            for name, value in counts.items():
+                current[name] += value
+
+    def instrument(self, client):
+        """Attribute a botocore client's calls to the current stage
+
+        :param client: botocore client (for a resource, `resource.meta.client`)
+
+        :returns: the client
+        """
+        client.meta.events.register("before-parameter-build", self._before_call)
+        client.meta.events.register("after-call", self._after_call)
+        return client
+
+    def _before_call(self, params, model, **kwargs):
+        service = model.service_model.service_name
+        if service == "dynamodb" and model.name in _CAPACITY_OPERATIONS:
+            params.setdefault("ReturnConsumedCapacity", "TOTAL")
+        elif service == "s3" and model.name in _WRITE_OPERATIONS:
+            body = params.get("Body", b"")
+            if isinstance(body, str):
+                body = body.encode("utf-8")
+            if isinstance(body, (bytes, bytearray)):
+                self._count(S3BytesWritten=len(body))
+            elif hasattr(body, "seek") and hasattr(body, "tell"):
+                ## botocore's S3 handlers have already wrapped the body
+                position = body.tell()
+                self._count(S3BytesWritten=body.seek(0, 2) - position)
+                body.seek(position)
+
+    def _after_call(self, parsed, **kwargs):
+        consumed = parsed.get("ConsumedCapacity", list())
+        if isinstance(consumed, dict):
+            consumed = [consumed]
+        self._count(
+            AWSCalls=1,
+            AWSErrors=1 if "Error" in parsed else 0,
+            AWSRetries=parsed.get("ResponseMetadata", dict()).get("RetryAttempts", 0),
+            DynamoDBCapacityUnits=sum(c.get("CapacityUnits", 0) for c in consumed),
+        )
+
+    def summary(self, handler):
+        """End the current stage and build the invocation's EMF record
+
+        :param handler: name of the handler, used as the metric dimension
+
+        :returns: dictionary in CloudWatch Embedded Metric Format
+        """
+        self.enter(self._stage)
+        with self._lock:
+            stages = {
+                stage: dict(values, Duration=round(values["Duration"] * 1000, 1))
+                for stage, values in self._stages.items()
+            }
+            duration = round((self._clock() - self._started) * 1000, 1)
+        totals = {
+            name: sum(values[name] for values in stages.values())
+            for name, _ in _COUNTERS
+        }
+        metrics = [{"Name": "Duration", "Unit": "Milliseconds"}]
+        metrics += [{"Name": name, "Unit": unit} for name, unit in _COUNTERS]
+        metrics += [
+            {"Name": f"{stage} Duration", "Unit": "Milliseconds"} for stage in stages
+        ]
+        return {
+            "_aws": {
+                "Timestamp": int(time.time() * 1000),
+                "CloudWatchMetrics": [
+                    {
+                        "Namespace": self.namespace,
+                        "Dimensions": [["Handler"]],
+                        "Metrics": metrics,
+                    }
+                ],
+            },
+            "Handler": handler,
+            "Duration": duration,
+            **totals,
+            **{
+                f"{stage} Duration": values["Duration"]
+                for stage, values in stages.items()
+            },
+            "stages": stages,
+        }
+
+    def emit(self, handler):
+        """Write the invocation's EMF record as a single log line
+
+        EMF records have to be bare JSON, so they go to a plain stdlib logger
+        rather than through the structlog renderer, which prefixes each line
+        with its callouts.
+
+        :param handler: name of the handler, used as the metric dimension
+
+        :returns: None
+        """
+        _emf_log.info(json.dumps(self.summary(handler), default=str))
+
+
+def report_metrics(handler):
+    """Decorate a Lambda handler to emit its `params.metrics` summary
+
+    :param handler: Lambda handler function
+
+    :returns: wrapped handler
+    """
+    name = handler.__module__.rsplit(".", 1)[-1]
+
+    @functools.wraps(handler)
+    def wrapper(event, context):
+        params.metrics.reset()
+        try:
+            return handler(event, context)
+        finally:
+            params.metrics.emit(name)
+
+    return wrapper
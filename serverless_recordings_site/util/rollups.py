@@ -0,0 +1,160 @@
+"""
+Compact summaries of the rollup pages, kept so that a new recording can be
+checked against them instead of re-reading the meetings table
+"""
+from .string_constructors import recording_path
+
+
+class OrganizationTopics:
+    """
+    The meeting topics listed on each organization page, kept as one small
+    document per organization in a state store.
+
+    :param store: state store holding the documents
+    """
+
+    PREFIX = "organization-topics/"
+
+    def __init__(self, store):
+        self._store = store
+
+    def _name(self, org):
+        return f"{self.PREFIX}{recording_path(organization=org)}.json"
+
+    def load(self, org):
+        """Read the topics of an organization
+
+        :param org: organization
+
+        :returns: set of meeting topics, or None if none have been recorded
+        """
+        document = self._store.load(self._name(org))
+        if document is None:
+            return None
+        return set(document["topics"])
+
+    def save(self, org, topics):
+        """Replace the topics of an organization
+
+        :param org: organization
+        :param topics: iterable of meeting topics
+
+        :returns: None
+        """
+        self._store.save(
+            self._name(org), {"organization": org, "topics": sorted(topics)}
+        )
+
+    def add(self, org, topics):
+        """Add topics to those of an organization
+
+        The union goes through the state store's `update()`, so topics that
+        concurrent invocations add are kept.
+
+        :param org: organization
+        :param topics: iterable of meeting topics
+
+        :returns: set of every topic recorded for the organization
+        """
+        document = self._store.update(
+            self._name(org),
+            lambda document: {
+                "organization": org,
+                "topics": sorted(set(document["topics"]).union(topics)),
+            },
+            default={"topics": list()},
+        )
+        return set(document["topics"])
+
+
+class TopicListings:
+    """
+    What the pages of each meeting topic were last rendered from: its newest
+    meetings, the years with meetings, and every meeting of the newest year,
+    kept as one small document per topic in a state store.  A new recording
+    is merged into the document, so its topic pages can be re-rendered
+    without reading the meetings table or waiting for its indexes to catch up.
+
+    :param store: state store holding the documents
+    """
+
+    PREFIX = "topic-listings/"
+
+    def __init__(self, store):
+        self._store = store
+
+    def _name(self, org, topic):
+        return (
+            f"{self.PREFIX}{recording_path(organization=org, meeting_topic=topic)}.json"
+        )
+
+    def load(self, org, topic):
+        """Read the listing of a topic
+
+        :param org: organization
+        :param topic: meeting topic
+
+        :returns: dictionary with `latest` (meetings, newest first), `years`
+            (newest first), `year` (the newest year) and `meetings` (that
+            year's meetings, newest first), or None if none has been recorded
+        """
+        return self._store.load(self._name(org, topic))
+
+    @staticmethod
+    def _document(org, topic, latest, years, year_meetings):
+        def _entries(meetings):
+            return [
+                {
+                    "start_time": meeting["start_time"],
+                    "recording_path": meeting["recording_path"],
+                }
+                for meeting in meetings
+            ]
+
+        return {
+            "organization": org,
+            "meeting_topic": topic,
+            "latest": _entries(latest),
+            "years": list(years),
+            "year": years[0] if years else None,
+            "meetings": _entries(year_meetings),
+        }
+
+    def save(self, org, topic, latest, years, year_meetings):
+        """Replace the listing of a topic
+
+        A listing that is already stored as it is is not written again, as
+        most listings are unchanged when the site is rebuilt.
+
+        :param org: organization
+        :param topic: meeting topic
+        :param latest: the topic's newest meetings, newest first
+        :param years: years with meetings, newest first
+        :param year_meetings: meetings of the newest year, newest first
+
+        :returns: None
+        """
+        name = self._name(org, topic)
+        document = self._document(org, topic, latest, years, year_meetings)
+        if self._store.load(name) != document:
+            self._store.save(name, document)
+
+    def update(self, org, topic, change):
+        """Change the listing of a topic without losing concurrent changes
+
+        The listing goes through the state store's `update()`, so when two
+        invocations merge recordings into it at once, the second merges into
+        what the first wrote.  `change` is called again for each retry.
+
+        :param org: organization
+        :param topic: meeting topic
+        :param change: callable taking the listing, as `load()` returns it,
+            and returning the new (latest, years, year_meetings), as for
+            `save()`
+
+        :returns: the listing as written
+        """
+        return self._store.update(
+            self._name(org, topic),
+            lambda listing: self._document(org, topic, *change(listing)),
+        )
@@ -0,0 +1,153 @@
+"""
+Write rendered pages to a local directory, tarball or zip file instead of S3,
+and read them back for syncing to the website bucket
+"""
+import io
+import json
+import os
+import tarfile
+import time
+import zipfile
+
+from .manifest import PageManifest
+
+## Member of the artifact listing each page's digest and S3 metadata
+BUILD_MANIFEST = ".build-manifest.json"
+
+
+def _archive_format(target):
+    if target.endswith((".tar.gz", ".tgz")):
+        return "w:gz"
+    if target.endswith(".tar"):
+        return "w"
+    if target.endswith(".zip"):
+        return "zip"
+    return None
+
+
+class SiteWriter:
+    """
+    Stand-in for `UploadPipeline` that stores pages in a local artifact.  The
+    kind of artifact follows from the name of `target`: `.tar`, `.tar.gz`
+    (or `.tgz`) and `.zip` make an archive, anything else a directory.
+    Along with the pages, the artifact holds a manifest of each page's
+    content digest and the metadata it is to be uploaded with.
+
+    :param target: file or directory name of the artifact
+    """
+
+    ## Pages are handed over whole rather than as S3 multipart uploads
+    multipart = False
+
+    def __init__(self, target):
+        self.target = target
+        self._format = _archive_format(target)
+        if self._format == "zip":
+            self._archive = zipfile.ZipFile(target, "w", zipfile.ZIP_DEFLATED)
+        elif self._format is not None:
+            self._archive = tarfile.open(target, self._format)
+        else:
+            os.makedirs(target, exist_ok=True)
+            self._archive = None
+        self._started = time.monotonic()
+        self.manifest = dict()
+        self.stats = {"pages": 0, "bytes": 0}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def _write(self, key, body):
+        if self._format == "zip":
+            ## A fixed timestamp keeps unchanged builds byte-for-byte identical
+            self._archive.writestr(
+                zipfile.ZipInfo(key, date_time=(1980, 1, 1, 0, 0, 0)), body
+            )
+        elif self._format is not None:
+            info = tarfile.TarInfo(key)
+            info.size = len(body)
+            self._archive.addfile(info, io.BytesIO(body))
+        else:
+            path = os.path.join(self.target, key)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, "wb") as fp:
+                fp.write(body)
+
+    def submit(self, key, body, on_success=None, **put_kwargs):
+        """Store a page in the artifact
+
+        :param key: S3 object key of the page
+        :param body: page content (str or bytes)
+        :param on_success: callable run once the page is stored
+        :param put_kwargs: S3.Client.put_object() arguments to upload it with
+
+        :returns: None
+        """
+        if isinstance(body, str):
+            body = body.encode("utf-8")
+        self._write(key, body)
+        self.manifest[key] = dict(
+            put_kwargs, digest=PageManifest.digest(body, metadata=put_kwargs)
+        )
+        self.stats["pages"] += 1
+        self.stats["bytes"] += len(body)
+        if on_success is not None:
+            on_success()
+
+    def close(self):
+        """Write the build manifest and finish the artifact
+
+        :returns: dictionary of statistics
+        """
+        if self.manifest is not None:
+            self._write(
+                BUILD_MANIFEST,
+                json.dumps(self.manifest, indent=0, sort_keys=True).encode("utf-8"),
+            )
+            self.manifest = None
+            if self._archive is not None:
+                self._archive.close()
+        self.stats["elapsed_seconds"] = round(time.monotonic() - self._started, 3)
+        return self.stats
+
+
+class SiteReader:
+    """
+    Read the pages of an artifact made by `SiteWriter`.
+
+    :param target: file or directory name of the artifact
+    """
+
+    def __init__(self, target):
+        self.target = target
+        self._format = _archive_format(target)
+        if self._format == "zip":
+            self._archive = zipfile.ZipFile(target)
+        elif self._format is not None:
+            self._archive = tarfile.open(target, self._format.replace("w", "r"))
+        else:
+            self._archive = None
+        self.manifest = json.loads(self.read(BUILD_MANIFEST))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if self._archive is not None:
+            self._archive.close()
+
+    def read(self, key):
+        """Read one page
+
+        :param key: S3 object key of the page
+
+        :returns: bytes
+        """
+        if self._format == "zip":
+            return self._archive.read(key)
+        if self._format is not None:
+            return self._archive.extractfile(key).read()
+        with open(os.path.join(self.target, key), "rb") as fp:
+            return fp.read()
@@ -0,0 +1,225 @@
+"""
+Small JSON documents that have to survive between Lambda invocations
+"""
+import copy
+import fcntl
+import json
+import os
+
+from botocore.exceptions import ClientError
+
+## Conditional writes retried before `update()` gives up
+UPDATE_ATTEMPTS = 5
+
+
+class S3StateStore:
+    """
+    Keep named JSON documents as objects under a prefix of an S3 bucket.
+
+    :param s3: boto3 S3 resource
+    :param bucket: name of the bucket holding the documents
+    :param prefix: key prefix for the documents (default="_state/")
+    """
+
+    def __init__(self, s3, bucket, prefix="_state/"):
+        self._s3 = s3
+        self._bucket = bucket
+        self._prefix = prefix
+
+    def load(self, name, default=None):
+        """Read a document
+
+        :param name: document name
+        :param default: returned when the document does not exist
+
+        :returns: the decoded JSON document
+        """
+        try:
+            response = self._s3.Object(self._bucket, f"{self._prefix}{name}").get()
+        except ClientError as e:
+            if e.response["Error"]["Code"] in ("NoSuchKey", "404"):
+                return default
+            raise RuntimeError from e
+        return json.loads(response["Body"].read())
+
+    def save(self, name, document):
+        """Write a document, replacing any previous version
+
+        :param name: document name
+        :param document: JSON-serializable document
+
+        :returns: None
+        """
+        try:
+            self._s3.Object(self._bucket, f"{self._prefix}{name}").put(
+                Body=json.dumps(document, separators=(",", ":")).encode("utf-8"),
+                ContentType="application/json",
+            )
+        except ClientError as e:
+            raise RuntimeError from e
+
+    def update(self, name, change, default=None):
+        """Read, change and write back a document
+
+        The write is conditional on the document being as it was read (its
+        ETag, or its absence), so concurrent updates are applied one after
+        the other instead of the last one overwriting the rest.  On a
+        conflict the document is read again and `change` applied afresh.
+
+        :param name: document name
+        :param change: callable taking the current document (or a copy of
+            `default`) and returning the new one
+        :param default: document to start from when it does not exist
+
+        :returns: the document as written
+        """
+        obj = self._s3.Object(self._bucket, f"{self._prefix}{name}")
+        for _ in range(UPDATE_ATTEMPTS):
+            try:
+                response = obj.get()
+                document = json.loads(response["Body"].read())
+                condition = {"IfMatch": response["ETag"]}
+            except ClientError as e:
+                if e.response["Error"]["Code"] not in ("NoSuchKey", "404"):
+                    raise RuntimeError from e
+                document = copy.deepcopy(default)
+                condition = {"IfNoneMatch": "*"}
+            document = change(document)
+            try:
+                obj.put(
+                    Body=json.dumps(document, separators=(",", ":")).encode("utf-8"),
+                    ContentType="application/json",
+                    **condition,
+                )
+                return document
+            except ClientError as e:
+                if e.response["Error"]["Code"] not in (
+                    "PreconditionFailed",
+                    "ConditionalRequestConflict",
+                ):
+                    raise RuntimeError from e
+        raise RuntimeError(f"{name} changed on every one of {UPDATE_ATTEMPTS} tries")
+
+    def names(self, prefix):
+        """List the documents whose names start with a prefix
+
+        :param prefix: document name prefix
+
+        :returns: sorted list of document names
+        """
+        try:
+            return sorted(
+                obj.key[len(self._prefix) :]
+                for obj in self._s3.Bucket(self._bucket).objects.filter(
+                    Prefix=f"{self._prefix}{prefix}"
+                )
+            )
+        except ClientError as e:
+            raise RuntimeError from e
+
+    def delete(self, name):
+        """Remove a document; removing a missing document is not an error
+
+        :param name: document name
+
+        :returns: None
+        """
+        try:
+            self._s3.Object(self._bucket, f"{self._prefix}{name}").delete()
+        except ClientError as e:
+            raise RuntimeError from e
+
+
+class LocalStateStore:
+    """
+    Stand-in for `S3StateStore` that keeps the documents as files in a local
+    directory, for running handlers and benchmarks without AWS.
+
+    :param directory: directory holding the documents
+    """
+
+    def __init__(self, directory):
+        self._directory = directory
+
+    def load(self, name, default=None):
+        """Read a document
+
+        :param name: document name
+        :param default: returned when the document does not exist
+
+        :returns: the decoded JSON document
+        """
+        try:
+            with open(os.path.join(self._directory, name), "rb") as fp:
+                return json.load(fp)
+        except FileNotFoundError:
+            return default
+
+    def save(self, name, document):
+        """Write a document, replacing any previous version
+
+        :param name: document name
+        :param document: JSON-serializable document
+
+        :returns: None
+        """
+        path = os.path.join(self._directory, name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        ## Readers never see a half-written document
+        with open(f"{path}.tmp-{os.getpid()}", "w") as fp:
+            json.dump(document, fp, separators=(",", ":"))
+        os.replace(fp.name, path)
+
+    def update(self, name, change, default=None):
+        """Read, change and write back a document
+
+        Updates are serialized with a lock file next to the document, so
+        concurrent updates are applied one after the other.
+
+        :param name: document name
+        :param change: callable taking the current document (or a copy of
+            `default`) and returning the new one
+        :param default: document to start from when it does not exist
+
+        :returns: the document as written
+        """
+        path = os.path.join(self._directory, name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(f"{path}.lock", "w") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            document = change(copy.deepcopy(self.load(name, default)))
+            self.save(name, document)
+        return document
+
+    def names(self, prefix):
+        """List the documents whose names start with a prefix
+
+        :param prefix: document name prefix
+
+        :returns: sorted list of document names
+        """
+        names = list()
+        for root, _, files in os.walk(self._directory):
+            for file in files:
+                name = os.path.relpath(os.path.join(root, file), self._directory)
+                name = name.replace(os.sep, "/")
+                ## Skip lock files and documents being written
+                if (
+                    name.startswith(prefix)
+                    and not name.endswith(".lock")
+                    and ".tmp-" not in name
+                ):
+                    names.append(name)
+        return sorted(names)
+
+    def delete(self, name):
+        """Remove a document; removing a missing document is not an error
+
+        :param name: document name
+
+        :returns: None
+        """
+        try:
+            os.remove(os.path.join(self._directory, name))
+        except FileNotFoundError:
+            pass
@@ -1,29 +1,48 @@
+import functools
 import re
 from datetime import datetime, timedelta
 
 import pytz
 
+## The project's timezone
+EASTERN_US_TZ = pytz.timezone("US/Eastern")
 
+
+@functools.lru_cache(maxsize=8192)
+def _eastern_utc_offset(utc_hour):
+    """UTC offset of US/Eastern during an hour, given as a naive UTC datetime
+
+    US/Eastern only changes its offset on the hour, so one `astimezone()` per
+    hour serves every timestamp in it.
+    """
+    return utc_hour.replace(tzinfo=pytz.UTC).astimezone(EASTERN_US_TZ).utcoffset()
+
+
+def _eastern_wall_time(timestamp):
+    """Convert a Zoom timestamp to naive US/Eastern wall-clock time"""
+    ## See https://stackoverflow.com/a/62769371/201674
+    dt = datetime.fromisoformat(timestamp.replace("Z", "+00:00")).replace(tzinfo=None)
+    return dt + _eastern_utc_offset(dt.replace(minute=0, second=0, microsecond=0))
+
+
+@functools.lru_cache(maxsize=8192)
 def project_time(timestamp, do_round=False, pretty=False):
     """Convert Zoom time string into the project's timezone (US/Eastern).
 
     :param timestamp: string, Timestamp from Zoom
-    :param round: boolean, Perform rounding to the nearest 5 minute mark
+    :param do_round: boolean, Perform rounding to the nearest 5 minute mark
     :param pretty: boolean, Returning human-readable string versus ISO time string
 
     :returns: string, Formatted time
     """
     # Convert to Eastern U.S. time
-    eastern_us_tz = pytz.timezone("US/Eastern")
-    ## See https://stackoverflow.com/a/62769371/201674
-    dt = datetime.fromisoformat(timestamp.replace("Z", "+00:00"))
-    dt = dt.replace(tzinfo=pytz.UTC).astimezone(eastern_us_tz)
+    dt = _eastern_wall_time(timestamp)
 
     # Round to nearest 5 minute mark
     ## See https://stackoverflow.com/a/10854034/201674
     if do_round:
         round_to = 5 * 60
-        seconds = (dt.replace(tzinfo=None) - dt.min).seconds
+        seconds = (dt - dt.min).seconds
         rounding = (seconds + round_to / 2) // round_to * round_to
         dt = dt + timedelta(0, rounding - seconds, -dt.microsecond)
 
@@ -35,6 +54,85 @@ def project_time(timestamp, do_round=False, pretty=False):
     return output
 
 
+def project_times(timestamps, do_round=False, pretty=False):
+    """Convert a column of Zoom time strings into the project's timezone.
+
+    :param timestamps: iterable of strings, Timestamps from Zoom
+    :param do_round: boolean, Perform rounding to the nearest 5 minute mark
+    :param pretty: boolean, Returning human-readable strings versus ISO time strings
+
+    :returns: list of strings, Formatted times in the order given
+    """
+    return [project_time(timestamp, do_round, pretty) for timestamp in timestamps]
+
+
+def project_year(timestamp):
+    """Year of a Zoom time string in the project's timezone (US/Eastern).
+
+    :param timestamp: string, Timestamp from Zoom
+
+    :returns: string, Four-digit year
+    """
+    return project_time(timestamp)[:4]
+
+
+def year_bounds(year):
+    """First and last Zoom time strings of a year in the project's timezone.
+
+    :param year: string or integer, Year
+
+    :returns: tuple of strings, Inclusive (start, end) UTC timestamps
+    """
+    start, end = (
+        EASTERN_US_TZ.localize(datetime(int(year) + i, 1, 1)).astimezone(pytz.UTC)
+        for i in (0, 1)
+    )
+    end = end - timedelta(seconds=1)
+    return start.strftime("%Y-%m-%dT%H:%M:%SZ"), end.strftime("%Y-%m-%dT%H:%M:%SZ")
+
+
+## Punctuation replaced by spaces before a meeting topic is slugged
+_TOPIC_PUNCTUATION = str.maketrans({c: " " for c in r"!@#$%^&*()[]{};:,./<>?\|`~=_+"})
+_TOPIC_SEPARATORS_RE = re.compile(r"[-\W]+")
+
+
+class Slugger:
+    """
+    Normalize meeting topics to URL-friendly path segments.
+
+    The pattern that strips an organization's name out of its topics is
+    compiled once per organization, and finished (organization, topic) paths
+    are memoized, so pages listing hundreds of topics don't redo the work.
+
+    :param maxsize: number of (organization, topic) paths to remember
+    """
+
+    def __init__(self, maxsize=4096):
+        self._organization_patterns = dict()
+        self.topic_path = functools.lru_cache(maxsize=maxsize)(self._topic_path)
+
+    def _organization_pattern(self, organization):
+        if (pattern := self._organization_patterns.get(organization)) is None:
+            pattern = re.compile(
+                r"\s*\(?" + organization + r"\)?\s*", flags=re.IGNORECASE
+            )
+            self._organization_patterns[organization] = pattern
+        return pattern
+
+    def _topic_path(self, organization, meeting_topic):
+        """Path of a topic: `organization/topic-slug`"""
+        # Normalize the meeting topic to a URL-friendly form
+        topic = self._organization_pattern(organization).sub("", meeting_topic)
+        topic = topic.translate(_TOPIC_PUNCTUATION)
+        topic = _TOPIC_SEPARATORS_RE.sub("-", topic).strip().lower().strip("-")
+        if topic:
+            return f"{organization.lower()}/{topic}"
+        return organization.lower()
+
+
+_slugger = Slugger()
+
+
 def recording_path(organization=None, meeting_topic=None, meeting_start=None):
     """Construct path or partial path to the recording.
 
@@ -44,25 +142,28 @@ def recording_path(organization=None, meeting_topic=None, meeting_start=None):
 
     :returns: string, File path corresponding to input parameters
     """
-    if meeting_topic:
-        # Normalize the meeting topic to a URL-friendly form
-        topic = re.sub(
-            r"\s*\(?" + organization + r"\)?\s*", "", meeting_topic, flags=re.IGNORECASE
-        )
-        topic = topic.translate({ord(c): " " for c in r"!@#$%^&*()[]{};:,./<>?\|`~=_+"})
-        topic = re.sub(r"[-\W]+", "-", topic).strip().lower().strip("-")
-    else:
-        topic = None
+    if not meeting_topic:
+        return organization.lower()
 
-    if meeting_start:
-        meeting_start_path = project_time(meeting_start, round=True, pretty=False)
-    else:
-        meeting_start_path = None
+    path = _slugger.topic_path(organization, meeting_topic)
+    if meeting_start and path != organization.lower():
+        path = f"{path}/{project_time(meeting_start, do_round=True, pretty=False)}"
+    return path
 
-    path = organization.lower()
-    if topic:
-        path = f"{path}/{topic}"
-        if meeting_start_path:
-            path = f"{path}/{meeting_start_path}"
 
-    return path
+def recording_paths(rows):
+    """Construct the paths for many recordings at once.
+
+    :param rows: iterable of dictionaries with `organization` and optionally
+        `meeting_topic` and `meeting_start` keys, as for `recording_path`
+
+    :returns: list of strings, File paths in the order given
+    """
+    return [
+        recording_path(
+            organization=row["organization"],
+            meeting_topic=row.get("meeting_topic"),
+            meeting_start=row.get("meeting_start"),
+        )
+        for row in rows
+    ]
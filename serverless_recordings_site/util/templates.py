@@ -0,0 +1,68 @@
+"""
+Load the Jinja page templates
+
+Templates are compiled to Python modules at package time by running this
+module (`python -m serverless_recordings_site.util.templates`).  The Lambda
+then imports the compiled templates instead of parsing `page_templates/` on
+each cold start, falling back to the template sources when they have not
+been compiled.
+"""
+import functools
+import os
+import sys
+
+import jinja2
+
+from .. import params
+
+## Directory with the deployed code; the repository root when run locally
+TASK_ROOT = os.environ.get(
+    "LAMBDA_TASK_ROOT",
+    os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))),
+)
+TEMPLATES_DIR = os.path.join(TASK_ROOT, "page_templates")
+COMPILED_TEMPLATES_DIR = os.path.join(TASK_ROOT, "compiled_templates")
+
+
+def template_environment():
+    """Create the Jinja environment for rendering pages
+
+    :returns: jinja2.Environment
+    """
+    if os.path.isdir(COMPILED_TEMPLATES_DIR):
+        loader = jinja2.ModuleLoader(COMPILED_TEMPLATES_DIR)
+    else:
+        loader = jinja2.FileSystemLoader(searchpath=TEMPLATES_DIR)
+    # Templates never change within a deployment, so skip the up-to-date checks
+    return jinja2.Environment(loader=loader, auto_reload=False)
+
+
+@functools.lru_cache(maxsize=None)
+def get_template(name):
+    """Get a page template, loading it at most once per container
+
+    :param name: template file name
+
+    :returns: jinja2.Template
+    """
+    return params.j2_env.get_template(name)
+
+
+def compile_templates(target=COMPILED_TEMPLATES_DIR):
+    """Compile the page templates to Python modules
+
+    :param target: directory to write the compiled templates to
+
+    :returns: None
+    """
+    env = jinja2.Environment(loader=jinja2.FileSystemLoader(searchpath=TEMPLATES_DIR))
+    env.compile_templates(
+        target,
+        zip=None,
+        filter_func=lambda name: name.endswith(".j2.html"),
+        ignore_errors=False,
+    )
+
+
+if __name__ == "__main__":
+    compile_templates(*sys.argv[1:])
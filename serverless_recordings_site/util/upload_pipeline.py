@@ -0,0 +1,275 @@
+"""
+Upload rendered pages to S3 from a bounded pool of worker threads, or from
+coroutines on an asyncio event loop
+
+Only the uploads are concurrent.  Pages are still rendered, and DynamoDB
+still queried, one at a time on the caller's thread.
+"""
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+
+import boto3
+from botocore.config import Config
+
+from .. import params
+
+try:
+    import aiobotocore.config
+    import aiobotocore.session
+except ImportError:  # `UPLOAD_BACKEND=asyncio` needs the optional `aiobotocore` package
+    aiobotocore = None
+
+
+class UploadPipeline:
+    """
+    Hand rendered pages to a pool of uploader threads that share one botocore
+    S3 client (botocore clients, unlike boto3 resources, are thread safe).
+
+    Callers render on their own thread and `submit()` the result.  At most
+    `max_pending` pages are queued or in flight at a time; further calls to
+    `submit()` block until a slot frees up, which keeps memory bounded when
+    rendering outpaces S3.  Upload failures, including errors raised by an
+    upload's `on_success`, are collected and raised as a single
+    `RuntimeError` when the pipeline is closed.
+
+    :param max_workers: number of uploader threads (default=8)
+    :param max_pending: pages allowed to be waiting or in flight
+        (default=four times `max_workers`)
+    """
+
+    ## Large pages bypass the pipeline as S3 multipart uploads
+    multipart = True
+
+    def __init__(self, max_workers=8, max_pending=None):
+        self._client = params.metrics.instrument(
+            boto3.client("s3", config=Config(max_pool_connections=max_workers))
+        )
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix="uploader"
+        )
+        self._start(max_workers, max_pending)
+
+    def _start(self, max_workers, max_pending):
+        self._slots = threading.BoundedSemaphore(max_pending or max_workers * 4)
+        self._lock = threading.Lock()
+        self._started = time.monotonic()
+        self.errors = list()
+        self.stats = {
+            "workers": max_workers,
+            "pages": 0,
+            "bytes": 0,
+            "failed": 0,
+            "upload_seconds": 0.0,
+        }
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close(raise_errors=exc_type is None)
+
+    def submit(self, key, body, on_success=None, **put_kwargs):
+        """Queue a page for upload, blocking while the pipeline is full
+
+        :param key: S3 object key
+        :param body: page content (str or bytes)
+        :param on_success: callable run on the uploader thread once the page is stored
+        :param put_kwargs: passed unmodified to S3.Client.put_object()
+
+        :returns: None
+        """
+        if isinstance(body, str):
+            body = body.encode("utf-8")
+        self._slots.acquire()
+        try:
+            self._executor.submit(self._upload, key, body, on_success, put_kwargs)
+        except BaseException:
+            self._slots.release()
+            raise
+
+    def _upload(self, key, body, on_success, put_kwargs):
+        started = time.monotonic()
+        try:
+            self._client.put_object(
+                Bucket=params.WEBSITE_BUCKET, Key=key, Body=body, **put_kwargs
+            )
+            self._stored(body, on_success, started)
+        except Exception as e:
+            ## Connection and credential errors are not ClientErrors, and
+            ## nothing reads the executor's futures, so record every failure
+            self._failed(key, e)
+        finally:
+            self._slots.release()
+
+    def _failed(self, key, e):
+        with self._lock:
+            self.errors.append(e)
+            self.stats["failed"] += 1
+        params.log.error("Upload page", reason=str(e), exception=e, fname=key)
+
+    def _stored(self, body, on_success, started):
+        if on_success is not None:
+            on_success()
+        with self._lock:
+            self.stats["pages"] += 1
+            self.stats["bytes"] += len(body)
+            self.stats["upload_seconds"] += time.monotonic() - started
+
+    def close(self, raise_errors=True):
+        """Wait for queued uploads to finish and report throughput
+
+        :param raise_errors: raise `RuntimeError` if any upload failed (default=True)
+
+        :returns: dictionary of throughput statistics
+        """
+        self._executor.shutdown(wait=True)
+        return self._report(raise_errors)
+
+    def _report(self, raise_errors):
+        elapsed = time.monotonic() - self._started
+        self.stats["elapsed_seconds"] = round(elapsed, 3)
+        self.stats["upload_seconds"] = round(self.stats["upload_seconds"], 3)
+        self.stats["pages_per_second"] = round(self.stats["pages"] / elapsed, 1)
+        self.stats["bytes_per_second"] = round(self.stats["bytes"] / elapsed)
+        params.log.info("Upload page", reason="Pipeline closed", stats=self.stats)
+        if self.errors and raise_errors:
+            raise RuntimeError(
+                f"{len(self.errors)} page upload(s) failed"
+            ) from self.errors[0]
+        return self.stats
+
+
+class AsyncUploadPipeline(UploadPipeline):
+    """
+    `UploadPipeline` whose uploads are coroutines on an asyncio event loop,
+    run by one background thread with an aiobotocore S3 client.  Keeping
+    dozens of uploads in flight then costs an open connection each rather
+    than a thread each.  Only the S3 puts run on the loop: the page
+    generators that call `submit()` still query DynamoDB and render with
+    blocking calls, so this speeds up upload-bound rebuilds, not the
+    queries of incremental or resumed rollups.
+
+    :param max_in_flight: number of concurrent uploads (default=32); up to
+        four times as many pages may be waiting
+    """
+
+    def __init__(self, max_in_flight=32):
+        if aiobotocore is None:
+            raise RuntimeError(
+                "UPLOAD_BACKEND=asyncio requires the aiobotocore package"
+            )
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(
+            target=self._loop.run_forever, name="uploader", daemon=True
+        )
+        self._thread.start()
+        ## future -> S3 key of each upload not yet settled
+        self._futures = dict()
+        self._start(max_in_flight, None)
+        self._client = self._call(self._open_client(max_in_flight))
+
+    def _call(self, coroutine):
+        return asyncio.run_coroutine_threadsafe(coroutine, self._loop).result()
+
+    async def _open_client(self, max_in_flight):
+        ## The semaphore belongs to the loop, so it is made on the loop's thread
+        self._in_flight = asyncio.Semaphore(max_in_flight)
+        self._client_context = aiobotocore.session.get_session().create_client(
+            "s3",
+            config=aiobotocore.config.AioConfig(max_pool_connections=max_in_flight),
+        )
+        return params.metrics.instrument(await self._client_context.__aenter__())
+
+    def submit(self, key, body, on_success=None, **put_kwargs):
+        """Queue a page for upload, blocking while the pipeline is full
+
+        :param key: S3 object key
+        :param body: page content (str or bytes)
+        :param on_success: callable run on the event loop's thread once the
+            page is stored
+        :param put_kwargs: passed unmodified to S3.Client.put_object()
+
+        :returns: None
+        """
+        if isinstance(body, str):
+            body = body.encode("utf-8")
+        self._slots.acquire()
+        try:
+            future = asyncio.run_coroutine_threadsafe(
+                self._upload(key, body, on_success, put_kwargs), self._loop
+            )
+        except BaseException:
+            self._slots.release()
+            raise
+        with self._lock:
+            self._futures[future] = key
+        future.add_done_callback(self._settle)
+
+    def _settle(self, future):
+        """Forget a finished upload, recording any error `_upload` did not
+
+        Runs as the future's done callback and again from `close()`, since
+        `wait()` can return before the callback has run; only the first call
+        for a future does anything.
+        """
+        with self._lock:
+            key = self._futures.pop(future, None)
+        if key is None:
+            return
+        try:
+            future.result()
+        except BaseException as e:
+            ## Cancellation, or anything else that escaped `_upload`
+            self._failed(key, e)
+
+    async def _upload(self, key, body, on_success, put_kwargs):
+        started = time.monotonic()
+        try:
+            async with self._in_flight:
+                await self._client.put_object(
+                    Bucket=params.WEBSITE_BUCKET, Key=key, Body=body, **put_kwargs
+                )
+            self._stored(body, on_success, started)
+        except Exception as e:
+            self._failed(key, e)
+        finally:
+            self._slots.release()
+
+    def close(self, raise_errors=True):
+        """Wait for queued uploads to finish and report throughput
+
+        :param raise_errors: raise `RuntimeError` if any upload failed (default=True)
+
+        :returns: dictionary of throughput statistics
+        """
+        if self._thread.is_alive():
+            with self._lock:
+                futures = list(self._futures)
+            wait(futures)
+            for future in futures:
+                self._settle(future)
+            self._call(self._client_context.__aexit__(None, None, None))
+            self._loop.call_soon_threadsafe(self._loop.stop)
+            self._thread.join()
+            self._loop.close()
+        return self._report(raise_errors)
+
+
+def upload_pipeline(max_workers=8, backend=None):
+    """Make the upload pipeline chosen by `backend`
+
+    :param max_workers: number of uploader threads, or of concurrent uploads
+        for the asyncio backend
+    :param backend: `threads` or `asyncio` (default from `UPLOAD_BACKEND`,
+        else `threads`)
+
+    :returns: UploadPipeline or AsyncUploadPipeline
+    """
+    backend = backend or params.UPLOAD_BACKEND
+    if backend == "asyncio":
+        return AsyncUploadPipeline(max_in_flight=max_workers)
+    if backend != "threads":
+        raise ValueError(f"Unknown upload backend {backend!r}")
+    return UploadPipeline(max_workers=max_workers)
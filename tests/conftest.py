@@ -0,0 +1,118 @@
+"""
+Shared fixtures: moto stand-ins for the meetings table, website bucket and
+notify queue, and a clean `params` for every test
+"""
+import os
+
+import pytest
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+os.environ.update(
+    AWS_DEFAULT_REGION="us-east-1",
+    AWS_ACCESS_KEY_ID="testing",
+    AWS_SECRET_ACCESS_KEY="testing",
+    MEETINGS_TABLE_ARN="arn:aws:dynamodb:us-east-1:123456789012:table/meetings",
+    NOTIFY_WEBBUILDER_QUEUE_ARN="arn:aws:sqs:us-east-1:123456789012:notify",
+    WEBSITE_BUCKET="website",
+    CLOUDFRONT_ID="DISTRIBUTION",
+    LAMBDA_TASK_ROOT=REPO_ROOT,
+)
+
+import boto3  # noqa: E402
+import structlog  # noqa: E402
+from moto import mock_aws  # noqa: E402
+
+from serverless_recordings_site import params  # noqa: E402
+from serverless_recordings_site.util.log_config import setup_logging  # noqa: E402
+from serverless_recordings_site.util.string_constructors import (  # noqa: E402
+    project_time,
+    recording_path,
+)
+
+
+@pytest.fixture(autouse=True)
+def clean_params():
+    """Forget the clients and state that a test put on `params`"""
+    setup_logging()
+    before = set(vars(params))
+    params.log = structlog.get_logger()
+    yield params
+    for name in set(vars(params)) - before:
+        delattr(params, name)
+    params.uploader = None
+    params.manifest = None
+    params.cache_invalidations = list()
+
+
+@pytest.fixture
+def aws():
+    """Create the meetings table, website bucket and notify queue in moto"""
+    with mock_aws():
+        boto3.client("dynamodb").create_table(
+            TableName="meetings",
+            BillingMode="PAY_PER_REQUEST",
+            KeySchema=[{"AttributeName": "recording_id", "KeyType": "HASH"}],
+            AttributeDefinitions=[
+                {"AttributeName": name, "AttributeType": "S"}
+                for name in (
+                    "recording_id",
+                    "recording_path",
+                    "meeting_topic",
+                    "organization",
+                    "start_time",
+                )
+            ],
+            GlobalSecondaryIndexes=[
+                {
+                    "IndexName": "path-index",
+                    "KeySchema": [
+                        {"AttributeName": "recording_path", "KeyType": "HASH"}
+                    ],
+                    "Projection": {"ProjectionType": "ALL"},
+                },
+                {
+                    "IndexName": "meeting-index",
+                    "KeySchema": [
+                        {"AttributeName": "meeting_topic", "KeyType": "HASH"},
+                        {"AttributeName": "start_time", "KeyType": "RANGE"},
+                    ],
+                    "Projection": {"ProjectionType": "ALL"},
+                },
+                {
+                    "IndexName": "organization-index",
+                    "KeySchema": [
+                        {"AttributeName": "organization", "KeyType": "HASH"},
+                        {"AttributeName": "start_time", "KeyType": "RANGE"},
+                    ],
+                    "Projection": {"ProjectionType": "ALL"},
+                },
+            ],
+        )
+        boto3.client("s3").create_bucket(Bucket="website")
+        boto3.client("sqs").create_queue(QueueName="notify")
+        yield
+
+
+def make_meeting(number, start_time, organization="FOLIO", topic="PC (FOLIO)"):
+    """A meeting document as the recordings pipeline stores it"""
+    path = recording_path(organization=organization, meeting_topic=topic)
+    return {
+        "recording_id": f"rec-{number:05d}",
+        "organization": organization,
+        "meeting_topic": topic,
+        "start_time": start_time,
+        "end_time": start_time,
+        "recording_path": f"{path}/{project_time(start_time, do_round=True)}",
+        "files": [{"recording_type": "audio_only", "s3_url": "https://example.org"}],
+    }
+
+
+@pytest.fixture
+def meetings_table(aws):
+    return boto3.resource("dynamodb").Table("meetings")
+
+
+@pytest.fixture
+def bucket(aws):
+    return boto3.resource("s3").Bucket("website")
@@ -0,0 +1,26 @@
+import tempfile
+
+from conftest import make_meeting
+from serverless_recordings_site import build_site
+from serverless_recordings_site.util.site_archive import SiteReader
+
+
+def test_builds_pages_and_cleans_up(tmp_path, monkeypatch):
+    monkeypatch.setattr(tempfile, "tempdir", str(tmp_path / "tmp"))
+    (tmp_path / "tmp").mkdir()
+    meetings = [
+        make_meeting(1, "2021-03-02T15:00:00Z"),
+        make_meeting(2, "2021-03-09T15:00:00Z", topic="Tech Council (FOLIO)"),
+    ]
+
+    build_site.build_site(iter(meetings), str(tmp_path / "site"), processes=2)
+
+    with SiteReader(str(tmp_path / "site")) as site:
+        keys = set(site.manifest)
+    assert {f"{m['recording_path']}/index.html" for m in meetings} <= keys
+    assert {
+        "folio/index.html",
+        "folio/pc/index.html",
+        "folio/search/index.json",
+    } <= keys
+    assert list((tmp_path / "tmp").iterdir()) == []
@@ -0,0 +1,51 @@
+import json
+
+from serverless_recordings_site.util.change_feed import stream_changes
+
+
+def _record(shard, sequence_number, recording_id, event_name="INSERT"):
+    return {
+        "eventName": event_name,
+        "shardId": shard,
+        "dynamodb": {
+            "SequenceNumber": str(sequence_number),
+            "NewImage": {"recording_id": {"S": recording_id}},
+        },
+    }
+
+
+def test_positions_are_kept_per_shard(tmp_path):
+    path = tmp_path / "stream.json"
+    path.write_text(
+        json.dumps(
+            {
+                "Records": [
+                    _record("shard-a", 500, "a-old"),
+                    _record("shard-a", 900, "a-new"),
+                    _record("shard-b", 100, "b-old"),
+                    _record("shard-b", 200, "b-new"),
+                    _record("shard-b", 300, "b-gone", event_name="REMOVE"),
+                ]
+            }
+        )
+    )
+
+    changes = list(stream_changes(path, after={"shard-a": "500", "shard-b": "100"}))
+
+    ## shard-b's sequence numbers are below shard-a's mark, but still new
+    assert [(position, m["recording_id"]) for position, m in changes] == [
+        (("shard-a", 900), "a-new"),
+        (("shard-b", 200), "b-new"),
+    ]
+
+
+def test_json_lines_without_shard_ids(tmp_path):
+    path = tmp_path / "stream.jsonl"
+    records = [_record("", 1, "first"), _record("", 2, "second")]
+    for record in records:
+        del record["shardId"]
+    path.write_text("\n".join(json.dumps(record) for record in records))
+
+    changes = list(stream_changes(path, after={"": "1"}))
+
+    assert [m["recording_id"] for _, m in changes] == ["second"]
@@ -0,0 +1,44 @@
+import os
+
+import pytest
+
+from serverless_recordings_site import params
+from serverless_recordings_site.util import html_pages
+from serverless_recordings_site.util.manifest import PageManifest
+
+
+def _failing_page(parts):
+    """Page chunks that fill `parts` multipart parts and then fail to render"""
+    for _ in range(parts):
+        yield os.urandom(html_pages.MULTIPART_PART_SIZE // 2).hex()
+    raise ValueError("template failed")
+
+
+def test_failed_stream_aborts_its_upload(bucket, monkeypatch):
+    monkeypatch.setattr(html_pages, "MULTIPART_PART_SIZE", 1024)
+
+    with pytest.raises(ValueError):
+        html_pages._put_page_stream(
+            "folio/pc/index.html", _failing_page(3), params.log, "test", "topic"
+        )
+
+    uploads = params.s3.meta.client.list_multipart_uploads(Bucket="website")
+    assert uploads.get("Uploads", []) == []
+    assert not list(bucket.objects.all())
+
+
+def test_a_new_cache_control_uploads_the_page_again(bucket, monkeypatch):
+    params.manifest = PageManifest(params.state_store)
+    html_pages._put_page("login.html", "<html></html>", params.log, "test", "static")
+    html_pages._put_page("login.html", "<html></html>", params.log, "test", "static")
+    assert params.manifest.skipped == 1
+
+    monkeypatch.setitem(html_pages.PAGE_CACHE_CONTROL, "static", "no-cache")
+    html_pages._put_page("login.html", "<html></html>", params.log, "test", "static")
+
+    assert params.manifest.skipped == 1
+    assert bucket.Object("login.html").cache_control == "no-cache"
+
+
+def test_meeting_pages_stay_out_of_shared_caches():
+    assert html_pages.PAGE_CACHE_CONTROL["meeting"].startswith("private")
@@ -0,0 +1,32 @@
+import logging
+import sys
+
+import structlog
+
+from serverless_recordings_site.util import log_config
+from serverless_recordings_site.util.log_config import TruncateLargeFields
+
+
+def test_tracebacks_are_not_truncated():
+    def fail(depth):
+        if depth:
+            fail(depth - 1)
+        raise ValueError("x" * 2000)
+
+    try:
+        fail(30)
+    except ValueError:
+        event_dict = {"event": "stage", "exc_info": sys.exc_info(), "body": "y" * 200}
+    event_dict = structlog.processors.format_exc_info(None, "error", event_dict)
+    traceback = event_dict["exception"]
+
+    event_dict = TruncateLargeFields(max_string=100)(None, "error", event_dict)
+
+    assert event_dict["exception"] == traceback
+    assert traceback.endswith("x" * 2000)
+    assert event_dict["body"].endswith("(200 characters)")
+
+
+def test_unknown_log_level_falls_back_to_info():
+    assert log_config._log_level("debug") == (logging.DEBUG, True)
+    assert log_config._log_level("LOUD") == (logging.INFO, False)
@@ -0,0 +1,98 @@
+import threading
+
+import boto3
+import pytest
+
+from serverless_recordings_site.util.manifest import PageManifest
+from serverless_recordings_site.util.state_store import LocalStateStore, S3StateStore
+
+
+@pytest.fixture(params=["s3", "local"])
+def store(request, tmp_path):
+    if request.param == "local":
+        yield LocalStateStore(str(tmp_path))
+    else:
+        request.getfixturevalue("aws")
+        yield S3StateStore(boto3.resource("s3"), "website")
+
+
+def test_skips_pages_recorded_by_an_earlier_invocation(store):
+    manifest = PageManifest(store)
+    assert not manifest.unchanged("folio/pc/index.html", "a")
+    manifest.record("folio/pc/index.html", "a")
+    assert manifest.save() == 1
+
+    manifest = PageManifest(store)
+    assert manifest.unchanged("folio/pc/index.html", "a")
+    assert not manifest.unchanged("folio/pc/index.html", "b")
+    assert manifest.skipped == 1
+
+
+def test_documents_are_per_organization(store):
+    manifest = PageManifest(store)
+    for key in ("folio/index.html", "reshare/index.html", "login.html"):
+        manifest.record(key, "a")
+    manifest.save()
+    assert store.names(PageManifest.PREFIX) == [
+        "page-manifest/_root.json",
+        "page-manifest/folio.json",
+        "page-manifest/reshare.json",
+    ]
+    assert store.load("page-manifest/folio.json") == {"folio/index.html": "a"}
+
+
+def test_concurrent_saves_keep_both_updates(store):
+    first, second = PageManifest(store), PageManifest(store)
+    first.unchanged("folio/a/index.html", "a")
+    second.unchanged("folio/b/index.html", "b")
+    first.record("folio/a/index.html", "a")
+    second.record("folio/b/index.html", "b")
+    second.save()
+    first.save()
+    assert store.load("page-manifest/folio.json") == {
+        "folio/a/index.html": "a",
+        "folio/b/index.html": "b",
+    }
+
+
+def test_update_retries_after_a_conflicting_write(aws):
+    store = S3StateStore(boto3.resource("s3"), "website")
+    calls = list()
+
+    def _change(document):
+        calls.append(dict(document))
+        if len(calls) == 1:
+            ## Another writer gets in between this read and write
+            store.save("doc.json", {"other": 1})
+        return dict(document, mine=1)
+
+    assert store.update("doc.json", _change, default=dict()) == {"other": 1, "mine": 1}
+    assert store.load("doc.json") == {"other": 1, "mine": 1}
+
+
+def test_local_updates_are_serialized(tmp_path):
+    store = LocalStateStore(str(tmp_path))
+
+    def _increment():
+        for _ in range(20):
+            store.update("count.json", lambda n: n + 1, default=0)
+
+    threads = [threading.Thread(target=_increment) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert store.load("count.json") == 80
+
+
+def test_metadata_is_part_of_the_digest():
+    body = b"<html></html>"
+    public = {"ContentType": "text/html", "CacheControl": "public, max-age=300"}
+    private = {"ContentType": "text/html", "CacheControl": "private, max-age=3600"}
+
+    assert PageManifest.digest(body, metadata=public) != PageManifest.digest(
+        body, metadata=private
+    )
+    assert PageManifest.digest(body, metadata=public) == PageManifest.digest(
+        body, metadata=dict(reversed(public.items()))
+    )
@@ -0,0 +1,51 @@
+from serverless_recordings_site import params
+from serverless_recordings_site.util import html_pages
+
+
+def _page(bucket):
+    return bucket.Object("folio/index.html").get()["Body"].read().decode("utf-8")
+
+
+def test_topics_added_concurrently_are_kept(bucket, monkeypatch):
+    html_pages.create_organization_page("FOLIO", ["PC (FOLIO)"])
+    interleaved = list()
+
+    def lagging_query(org):
+        ## The index has neither new topic yet; the other invocation runs
+        ## while this one is between its query and its write
+        if not interleaved:
+            interleaved.append(org)
+            html_pages.update_organization_page(org, {"Tech Council (FOLIO)"})
+        return {"PC (FOLIO)"}
+
+    monkeypatch.setattr(html_pages, "_query_organization_topics", lagging_query)
+    assert html_pages.update_organization_page("FOLIO", {"Sys Ops (FOLIO)"})
+
+    topics = {"PC (FOLIO)", "Sys Ops (FOLIO)", "Tech Council (FOLIO)"}
+    assert params.organization_topics.load("FOLIO") == topics
+    page = _page(bucket)
+    assert all(topic in page for topic in topics)
+
+
+def test_a_stale_page_does_not_replace_a_newer_one(bucket, monkeypatch):
+    html_pages.create_organization_page("FOLIO", ["PC (FOLIO)"])
+    monkeypatch.setattr(
+        html_pages, "_query_organization_topics", lambda org: {"PC (FOLIO)"}
+    )
+    render = html_pages._organization_page
+    interleaved = list()
+
+    def slow_render(org, topics):
+        ## The other invocation adds its topic and writes its page after
+        ## this one read the summary, but before this one writes
+        if not interleaved:
+            interleaved.append(org)
+            html_pages.update_organization_page(org, {"Tech Council (FOLIO)"})
+        return render(org, topics)
+
+    monkeypatch.setattr(html_pages, "_organization_page", slow_render)
+    html_pages.update_organization_page("FOLIO", {"Sys Ops (FOLIO)"})
+
+    page = _page(bucket)
+    assert "Sys Ops (FOLIO)" in page
+    assert "Tech Council (FOLIO)" in page
@@ -0,0 +1,41 @@
+import json
+
+from conftest import make_meeting
+from serverless_recordings_site import params, queue_receiver
+
+
+class _CloudFront:
+    def __init__(self):
+        self.paths = list()
+
+    def create_invalidation(self, **kwargs):
+        self.paths.extend(kwargs["InvalidationBatch"]["Paths"]["Items"])
+        return dict()
+
+
+def _records(*bodies):
+    return [
+        {
+            "messageId": f"message-{i}",
+            "receiptHandle": f"receipt-{i}",
+            "body": json.dumps(body),
+        }
+        for i, body in enumerate(bodies)
+    ]
+
+
+def test_a_malformed_message_fails_alone(meetings_table, bucket):
+    params.cloudfront = _CloudFront()
+    good = make_meeting(1, "2021-06-01T14:00:00Z")
+    meetings_table.put_item(Item=good)
+    ## Same topic, but a start time its meeting page cannot be rendered from
+    bad = dict(make_meeting(2, "2021-06-08T14:00:00Z"), start_time="8 June 2021")
+
+    response = queue_receiver.handler({"Records": _records(bad, good)}, None)
+
+    assert response == {"batchItemFailures": [{"itemIdentifier": "message-0"}]}
+    keys = {o.key for o in bucket.objects.all()}
+    assert f"{good['recording_path']}/index.html" in keys
+    topic_page = bucket.Object("folio/pc/index.html").get()["Body"].read()
+    assert good["recording_path"].encode() in topic_page
+    assert bad["recording_path"].encode() not in topic_page
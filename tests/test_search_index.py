@@ -0,0 +1,70 @@
+import json
+
+from conftest import make_meeting
+from serverless_recordings_site.util import html_pages
+
+
+def _shard(bucket, year):
+    return json.loads(bucket.Object(f"folio/search/{year}.json").get()["Body"].read())
+
+
+def _paths(shard):
+    return {path for _, _, path in shard["recordings"]}
+
+
+def test_merges_keep_published_recordings(bucket):
+    first = make_meeting(1, "2021-03-02T15:00:00Z")
+    second = make_meeting(2, "2021-03-09T15:00:00Z", topic="Tech Council (FOLIO)")
+    older = make_meeting(3, "2019-05-01T15:00:00Z")
+
+    html_pages.create_search_index("FOLIO", {first["meeting_topic"]: [first]})
+    html_pages.create_search_index(
+        "FOLIO", {second["meeting_topic"]: [second], older["meeting_topic"]: [older]}
+    )
+
+    shard = _shard(bucket, "2021")
+    assert _paths(shard) == {
+        f"/{first['recording_path']}/",
+        f"/{second['recording_path']}/",
+    }
+    assert shard["topics"] == ["PC (FOLIO)", "Tech Council (FOLIO)"]
+    catalog = json.loads(bucket.Object("folio/search/index.json").get()["Body"].read())
+    assert catalog["years"] == ["2021", "2019"]
+
+
+def test_a_concurrent_merge_is_not_overwritten(bucket, monkeypatch):
+    first = make_meeting(1, "2021-03-02T15:00:00Z")
+    html_pages.create_search_index("FOLIO", {first["meeting_topic"]: [first]})
+    racing = make_meeting(2, "2021-03-09T15:00:00Z")
+    late = make_meeting(3, "2021-03-16T15:00:00Z")
+
+    ## Another invocation merges its recording between this one's read and
+    ## its write
+    get_page = html_pages._get_page
+    raced = list()
+
+    def racing_get_page(fname):
+        published = get_page(fname)
+        if fname.endswith("2021.json") and not raced:
+            raced.append(fname)
+            html_pages.create_search_index("FOLIO", {racing["meeting_topic"]: [racing]})
+        return published
+
+    monkeypatch.setattr(html_pages, "_get_page", racing_get_page)
+    html_pages.create_search_index("FOLIO", {late["meeting_topic"]: [late]})
+
+    assert _paths(_shard(bucket, "2021")) == {
+        f"/{meeting['recording_path']}/" for meeting in (first, racing, late)
+    }
+
+
+def test_replace_drops_unlisted_recordings(bucket):
+    first = make_meeting(1, "2021-03-02T15:00:00Z")
+    second = make_meeting(2, "2021-03-09T15:00:00Z")
+    html_pages.create_search_index("FOLIO", {first["meeting_topic"]: [first]})
+
+    html_pages.create_search_index(
+        "FOLIO", {second["meeting_topic"]: [second]}, replace=True
+    )
+
+    assert _paths(_shard(bucket, "2021")) == {f"/{second['recording_path']}/"}
@@ -0,0 +1,75 @@
+from datetime import datetime, timedelta
+
+import pytest
+import pytz
+
+from serverless_recordings_site.util.string_constructors import (
+    project_time,
+    project_year,
+    year_bounds,
+)
+
+
+def _reference_project_time(timestamp, do_round=False, pretty=False):
+    """`project_time` as first written, with `astimezone()`"""
+    dt = datetime.fromisoformat(timestamp.replace("Z", "+00:00"))
+    dt = dt.replace(tzinfo=pytz.UTC).astimezone(pytz.timezone("US/Eastern"))
+    if do_round:
+        round_to = 5 * 60
+        seconds = (dt.replace(tzinfo=None) - dt.min).seconds
+        rounding = (seconds + round_to / 2) // round_to * round_to
+        dt = dt + timedelta(0, rounding - seconds, -dt.microsecond)
+    if pretty:
+        return dt.strftime("%e-%b-%Y %H:%M Eastern U.S. time")
+    return dt.strftime("%Y-%m-%dT%H:%M")
+
+
+def _timestamps():
+    """Every 97 minutes from 2015 to 2030, and each minute around each
+    daylight saving change"""
+    dt, end = datetime(2015, 1, 1), datetime(2030, 1, 1)
+    while dt < end:
+        yield dt.strftime("%Y-%m-%dT%H:%M:%SZ")
+        dt += timedelta(minutes=97, seconds=11)
+    for year in range(2015, 2030):
+        for month, day in ((3, 8), (11, 1)):
+            ## Changes fall on the first Sunday on or after these days, at
+            ## 06:00 or 07:00 UTC
+            sunday = datetime(year, month, day) + timedelta(
+                days=(6 - datetime(year, month, day).weekday())
+            )
+            start = sunday + timedelta(hours=4)
+            for minute in range(5 * 60):
+                moment = start + timedelta(minutes=minute)
+                yield moment.strftime("%Y-%m-%dT%H:%M:%SZ")
+
+
+@pytest.mark.parametrize(
+    "do_round, pretty", [(False, False), (True, False), (False, True)]
+)
+def test_matches_astimezone(do_round, pretty):
+    mismatches = [
+        timestamp
+        for timestamp in _timestamps()
+        if project_time(timestamp, do_round, pretty)
+        != _reference_project_time(timestamp, do_round, pretty)
+    ]
+    assert mismatches == []
+
+
+def test_daylight_saving_changes():
+    assert project_time("2021-03-14T06:59:00Z") == "2021-03-14T01:59"
+    assert project_time("2021-03-14T07:00:00Z") == "2021-03-14T03:00"
+    assert project_time("2021-11-07T05:30:00Z") == "2021-11-07T01:30"
+    assert project_time("2021-11-07T06:30:00Z") == "2021-11-07T01:30"
+    assert project_time("2021-11-07T14:58:00Z", do_round=True) == "2021-11-07T10:00"
+    assert (
+        project_time("2021-07-04T16:00:00Z", pretty=True)
+        == " 4-Jul-2021 12:00 Eastern U.S. time"
+    )
+
+
+def test_years_run_from_eastern_midnight():
+    assert project_year("2022-01-01T04:59:59Z") == "2021"
+    assert project_year("2022-01-01T05:00:00Z") == "2022"
+    assert year_bounds(2022) == ("2022-01-01T05:00:00Z", "2023-01-01T04:59:59Z")
@@ -0,0 +1,107 @@
+import boto3
+import pytest
+
+from conftest import make_meeting
+from serverless_recordings_site import params
+from serverless_recordings_site.util import html_pages
+from serverless_recordings_site.util.rollups import TopicListings
+from serverless_recordings_site.util.state_store import LocalStateStore, S3StateStore
+
+
+def _entry(meeting):
+    return {k: meeting[k] for k in ("start_time", "recording_path")}
+
+
+@pytest.fixture(params=["s3", "local"])
+def store(request, tmp_path, aws):
+    if request.param == "local":
+        store = LocalStateStore(str(tmp_path))
+    else:
+        store = S3StateStore(boto3.resource("s3"), "website")
+    params.topic_listings = TopicListings(store)
+    return store
+
+
+def test_new_recordings_are_merged_into_the_listing(store, meetings_table):
+    old = make_meeting(1, "2020-11-03T15:00:00Z")
+    meetings_table.put_item(Item=old)
+    first = make_meeting(2, "2021-03-02T15:00:00Z")
+    second = make_meeting(3, "2021-03-09T15:00:00Z")
+
+    ## The first merge starts the listing from the table, the second from it
+    html_pages.update_topic_page("FOLIO", "PC (FOLIO)", [_entry(first)])
+    meetings_table.delete_item(Key={"recording_id": old["recording_id"]})
+    html_pages.update_topic_page("FOLIO", "PC (FOLIO)", [_entry(second)])
+
+    listing = params.topic_listings.load("FOLIO", "PC (FOLIO)")
+    assert listing["latest"] == [_entry(second), _entry(first), _entry(old)]
+    assert listing["years"] == ["2021", "2020"]
+    assert listing["meetings"] == [_entry(second), _entry(first)]
+    page = boto3.resource("s3").Object("website", "folio/pc/index.html").get()
+    assert old["recording_path"].encode() in page["Body"].read()
+
+
+def test_a_concurrent_merge_is_kept(aws):
+    listings = TopicListings(S3StateStore(boto3.resource("s3"), "website"))
+    first = _entry(make_meeting(1, "2021-03-02T15:00:00Z"))
+    racing = _entry(make_meeting(2, "2021-03-09T15:00:00Z"))
+    listings.save("FOLIO", "PC (FOLIO)", [first], ["2021"], [first])
+    calls = list()
+
+    def add(meeting):
+        def change(listing):
+            calls.append(meeting)
+            if len(calls) == 1:
+                ## Another invocation writes between this read and write
+                listings.update("FOLIO", "PC (FOLIO)", add(racing))
+            latest = html_pages._merge_meetings(listing["latest"], [meeting])
+            return latest, listing["years"], latest
+
+        return change
+
+    late = _entry(make_meeting(3, "2021-03-16T15:00:00Z"))
+    listing = listings.update("FOLIO", "PC (FOLIO)", add(late))
+
+    assert listing["latest"] == [late, racing, first]
+    assert listings.load("FOLIO", "PC (FOLIO)") == listing
+    assert calls == [late, racing, late]
+
+
+def test_an_unchanged_listing_is_not_written_again(store, monkeypatch):
+    first = _entry(make_meeting(1, "2021-03-02T15:00:00Z"))
+    second = _entry(make_meeting(2, "2021-03-09T15:00:00Z"))
+    params.topic_listings.save("FOLIO", "PC (FOLIO)", [first], ["2021"], [first])
+    saved = list()
+    monkeypatch.setattr(store, "save", lambda name, document: saved.append(name))
+
+    params.topic_listings.save("FOLIO", "PC (FOLIO)", [first], ["2021"], [first])
+    assert saved == list()
+    params.topic_listings.save(
+        "FOLIO", "PC (FOLIO)", [second, first], ["2021"], [second, first]
+    )
+    assert saved == ["topic-listings/folio/pc.json"]
+
+
+def test_a_stale_render_does_not_replace_newer_pages(store, monkeypatch):
+    first = _entry(make_meeting(1, "2021-03-02T15:00:00Z"))
+    html_pages.update_topic_page("FOLIO", "PC (FOLIO)", [first])
+    racing = _entry(make_meeting(2, "2021-03-09T15:00:00Z"))
+    render = html_pages._topic_landing_page
+    interleaved = list()
+
+    def slow_render(*args):
+        ## The other invocation merges its recording and writes its pages
+        ## after this one merged, but before this one writes
+        if not interleaved:
+            interleaved.append(args)
+            html_pages.update_topic_page("FOLIO", "PC (FOLIO)", [racing])
+        return render(*args)
+
+    monkeypatch.setattr(html_pages, "_topic_landing_page", slow_render)
+    late = _entry(make_meeting(3, "2021-03-16T15:00:00Z"))
+    html_pages.update_topic_page("FOLIO", "PC (FOLIO)", [late])
+
+    for fname in ("folio/pc/index.html", "folio/pc/2021.html"):
+        page = boto3.resource("s3").Object("website", fname).get()["Body"].read()
+        for meeting in (first, racing, late):
+            assert meeting["recording_path"].encode() in page
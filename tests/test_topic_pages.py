@@ -0,0 +1,63 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+from conftest import make_meeting
+from serverless_recordings_site import params
+from serverless_recordings_site.util import html_pages
+from serverless_recordings_site.util.string_constructors import project_year
+
+
+@pytest.fixture
+def queries(meetings_table, monkeypatch):
+    """Record the arguments of each query of the meetings table"""
+    calls = list()
+    query = params.meetings_table.query
+
+    def counting_query(**kwargs):
+        calls.append(kwargs)
+        return query(**kwargs)
+
+    monkeypatch.setattr(params.meetings_table, "query", counting_query)
+    return calls
+
+
+@pytest.fixture
+def busy_topic(meetings_table):
+    """A topic with 300 weekly meetings, from 2016 to 2021"""
+    start = datetime(2016, 4, 5, 14)
+    meetings = [
+        make_meeting(i, (start + timedelta(weeks=i)).strftime("%Y-%m-%dT%H:%M:%SZ"))
+        for i in range(300)
+    ]
+    with meetings_table.batch_writer() as batch:
+        for meeting in meetings:
+            batch.put_item(Item=meeting)
+    return meetings
+
+
+def test_latest_meetings_read_one_page(busy_topic, queries):
+    latest = html_pages._latest_meetings("PC (FOLIO)")
+
+    assert [m["recording_id"] for m in latest] == [
+        f"rec-{i:05d}" for i in range(299, 279, -1)
+    ]
+    assert len(queries) == 1
+
+
+def test_topic_without_a_listing_is_not_read_whole(busy_topic, queries, bucket):
+    html_pages.update_topic_page(
+        "FOLIO",
+        "PC (FOLIO)",
+        [{k: busy_topic[-1][k] for k in ("start_time", "recording_path")}],
+    )
+
+    ## The newest meetings, the oldest one, the years in between, and the
+    ## newest year's archive; none of them beyond its first page
+    limited = [call for call in queries if "Limit" in call]
+    assert all("ExclusiveStartKey" not in call for call in limited)
+    years = {project_year(m["start_time"]) for m in busy_topic}
+    assert len(queries) == 2 + (len(years) - 2) + 1
+    listing = params.topic_listings.load("FOLIO", "PC (FOLIO)")
+    assert len(listing["latest"]) == html_pages.LATEST_MEETINGS
+    assert listing["years"] == sorted(years, reverse=True)
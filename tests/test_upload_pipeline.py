@@ -0,0 +1,85 @@
+import asyncio
+
+import pytest
+from botocore.exceptions import EndpointConnectionError
+
+from serverless_recordings_site.util.upload_pipeline import (
+    AsyncUploadPipeline,
+    UploadPipeline,
+)
+
+
+class FailingClient:
+    def __init__(self, error):
+        self.error = error
+
+    def put_object(self, **kwargs):
+        raise self.error
+
+
+class AsyncClient:
+    def __init__(self, error=None):
+        self.error = error
+
+    async def put_object(self, **kwargs):
+        if self.error is not None:
+            raise self.error
+
+
+def _threads(error=None):
+    pipeline = UploadPipeline(max_workers=2)
+    if error is not None:
+        pipeline._client = FailingClient(error)
+    return pipeline
+
+
+def _asyncio(error=None):
+    pytest.importorskip("aiobotocore")
+    pipeline = AsyncUploadPipeline(max_in_flight=2)
+    pipeline._client = AsyncClient(error)
+    return pipeline
+
+
+@pytest.fixture(params=[_threads, _asyncio], ids=["threads", "asyncio"])
+def make_pipeline(request):
+    return request.param
+
+
+def test_uploads_pages(bucket):
+    stored = list()
+    with UploadPipeline(max_workers=2) as pipeline:
+        for i in range(5):
+            pipeline.submit(f"page{i}.html", "<p>", on_success=lambda: stored.append(1))
+    assert pipeline.stats["pages"] == 5
+    assert len(stored) == 5
+    assert len(list(bucket.objects.all())) == 5
+
+
+def test_connection_errors_fail_close(make_pipeline):
+    pipeline = make_pipeline(EndpointConnectionError(endpoint_url="x"))
+    pipeline.submit("page.html", b"<p>")
+    with pytest.raises(RuntimeError, match="1 page upload"):
+        pipeline.close()
+    assert pipeline.stats["failed"] == 1
+
+
+def test_on_success_errors_fail_close(bucket, make_pipeline):
+    def _fail():
+        raise ValueError("manifest")
+
+    pipeline = make_pipeline()
+    pipeline.submit("page.html", b"<p>", on_success=_fail)
+    with pytest.raises(RuntimeError):
+        pipeline.close()
+    assert pipeline.stats == dict(pipeline.stats, pages=0, failed=1)
+
+
+def test_cancelled_uploads_fail_close():
+    ## Cancellation is not an Exception, so `_upload` lets it through and
+    ## `close()` finds it in the upload's future
+    pipeline = _asyncio(asyncio.CancelledError())
+    for i in range(3):
+        pipeline.submit(f"page{i}.html", b"<p>")
+    with pytest.raises(RuntimeError, match="3 page upload"):
+        pipeline.close()
+    assert pipeline.stats["failed"] == 3